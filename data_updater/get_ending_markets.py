@@ -2,24 +2,65 @@
 # 不一定带rewards
 
 import argparse
+import atexit
+import heapq
 import os
-import json
+import re
 from pathlib import Path
 from datetime import datetime, timedelta, timezone
-from typing import List, Dict, Any
+from typing import BinaryIO, List, Dict, Any, Optional, Tuple
 
 import requests
 
+# 兼容以文件路径直接运行：尝试从项目根导入 data_updater 包
+try:
+    from data_updater.http_utils import build_session, dumps, loads
+except ModuleNotFoundError:
+    import sys
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from data_updater.http_utils import build_session, dumps, loads
+
 
 BASE_URL = "https://gamma-api.polymarket.com/markets"
 
+_SESSION = build_session()
+atexit.register(_SESSION.close)
+
+# API 绝大多数返回 YYYY-MM-DDTHH:MM:SSZ，命中时直接切分构造 datetime，跳过 fromisoformat/strptime
+_FAST_END_RE = re.compile(r"^(\d{4})-(\d{2})-(\d{2})T(\d{2}):(\d{2}):(\d{2})Z$")
+
+
+def _write_json_list(f: BinaryIO, items: List[Any], indent: bool = False) -> None:
+    """
+    逐条序列化写入 JSON 数组，避免先把整份文档生成为一个巨大的字符串/bytes。
+    indent=True 时与 json.dumps(..., indent=2) 的排版一致：每个元素整体再缩进 2 空格。
+    """
+    if not items:
+        f.write(b"[]\n")
+        return
+    if not indent:
+        f.write(b"[")
+        for i, item in enumerate(items):
+            if i:
+                f.write(b",")
+            f.write(dumps(item))
+        f.write(b"]\n")
+        return
+    f.write(b"[\n")
+    for i, item in enumerate(items):
+        if i:
+            f.write(b",\n")
+        # JSON 字符串内的换行已转义为 \n，因此按换行符加缩进不会改动字符串内容
+        f.write(b"  " + dumps(item, True).replace(b"\n", b"\n  "))
+    f.write(b"\n]\n")
+
 
 def to_iso_z(dt: datetime) -> str:
     """将 datetime 转为带 Z 的 ISO8601 字符串。"""
     return dt.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
 
 
-def fetch_markets(hours: int = 24, min_liquidity: float = 1000.0, limit: int = 500) -> List[Dict[str, Any]]:
+def fetch_markets(hours: int = 24, min_liquidity: float = 1000.0, limit: int = 500, top: Optional[int] = None) -> List[Dict[str, Any]]:
     """
     获取将在未来指定小时内结束、未关闭、且流动性大于指定 USDC 的市场。
 
@@ -33,6 +74,7 @@ def fetch_markets(hours: int = 24, min_liquidity: float = 1000.0, limit: int = 5
         hours: 结束时间窗口（小时），默认 24 小时内结束。
         min_liquidity: 最小流动性（USDC）。
         limit: API 返回上限，默认 500。
+        top: 只返回最早结束的前 N 个市场；None 表示全部返回。
 
     Returns:
         List[Dict]: 满足条件的市场列表。
@@ -55,10 +97,10 @@ def fetch_markets(hours: int = 24, min_liquidity: float = 1000.0, limit: int = 5
     if os.getenv("HTTPS_PROXY") or os.getenv("HTTP_PROXY"):
         print("检测到代理环境变量，HTTP 请求将通过代理发送。")
 
-    resp = requests.get(BASE_URL, params=params, timeout=30)
+    resp = _SESSION.get(BASE_URL, params=params, timeout=30)
     resp.raise_for_status()
 
-    data = resp.json()
+    data = loads(resp.content)
 
     # 响应可能直接是列表，也可能包装在字典中
     if isinstance(data, dict):
@@ -75,8 +117,15 @@ def fetch_markets(hours: int = 24, min_liquidity: float = 1000.0, limit: int = 5
         val = m.get("endDateIso") or m.get("endDate")
         if not val:
             return datetime.max.replace(tzinfo=timezone.utc)
+        s = str(val).strip()
+        fast = _FAST_END_RE.match(s)
+        if fast:
+            try:
+                return datetime(*map(int, fast.groups()), tzinfo=timezone.utc)
+            except ValueError:
+                # 数值越界（如 2 月 30 日）视为解析失败
+                return datetime.max.replace(tzinfo=timezone.utc)
         try:
-            s = str(val).strip()
             # 将尾部 Z 标记替换为 +00:00，便于 fromisoformat 解析毫秒等格式
             if s.endswith("Z") or s.endswith("z"):
                 s = s[:-1] + "+00:00"
@@ -95,7 +144,9 @@ def fetch_markets(hours: int = 24, min_liquidity: float = 1000.0, limit: int = 5
             dt = dt.astimezone(timezone.utc)
         return dt
 
-    soon = []
+    window_end = now + timedelta(hours=hours)
+    # (end_dt, market)：解析一次结束时间，排序时直接复用
+    soon: List[Tuple[datetime, Dict[str, Any]]] = []
     for m in results:
         # 过滤 closed=false
         if m.get("closed") is True:
@@ -112,14 +163,17 @@ def fetch_markets(hours: int = 24, min_liquidity: float = 1000.0, limit: int = 5
 
         # 过滤结束时间窗口（冗余校验）
         end_dt = _parse_end_date(m)
-        if not (now <= end_dt <= now + timedelta(hours=hours)):
+        if not (now <= end_dt <= window_end):
             continue
 
-        soon.append(m)
+        soon.append((end_dt, m))
 
-    # 按结束时间升序排列
-    soon.sort(key=_parse_end_date)
-    return soon
+    # 按结束时间升序排列；只需前 N 个时用堆取 top-K，避免对全部结果排序
+    if top is not None:
+        soon = heapq.nsmallest(top, soon, key=lambda t: t[0])
+    else:
+        soon.sort(key=lambda t: t[0])
+    return [m for _, m in soon]
 
 
 def main():
@@ -127,11 +181,13 @@ def main():
     parser.add_argument("--hours", type=int, default=24, help="结束时间窗口（小时），默认 24")
     parser.add_argument("--liquidity", type=float, default=1000.0, help="最小流动性（USDC），默认 1000")
     parser.add_argument("--limit", type=int, default=500, help="API 返回上限，默认 500")
+    parser.add_argument("--top", type=int, default=None, help="只保留最早结束的前 N 个市场，默认全部")
+    parser.add_argument("--indent", action="store_true", help="以 2 空格缩进输出 JSON，默认紧凑格式")
     parser.add_argument("--out", type=str, default="data/ending_markets.json", help="输出 JSON 文件路径，默认 data/ending_markets.json")
     args = parser.parse_args()
 
     try:
-        markets = fetch_markets(hours=args.hours, min_liquidity=args.liquidity, limit=args.limit)
+        markets = fetch_markets(hours=args.hours, min_liquidity=args.liquidity, limit=args.limit, top=args.top)
     except requests.HTTPError as e:
         print(f"HTTP 错误：{e}")
         return
@@ -154,8 +210,8 @@ def main():
     out_path = Path(args.out)
     try:
         out_path.parent.mkdir(parents=True, exist_ok=True)
-        with open(out_path, "w", encoding="utf-8") as f:
-            json.dump(markets, f, ensure_ascii=False, indent=2)
+        with open(out_path, "wb") as f:
+            _write_json_list(f, markets, indent=args.indent)
         print(f"\n已保存到: {out_path.resolve()}")
     except Exception as e:
         print(f"保存 JSON 文件失败: {e}")
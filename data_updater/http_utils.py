@@ -0,0 +1,60 @@
+# data_updater 各脚本共用的 HTTP / JSON 工具
+
+import json
+import threading
+from typing import Any
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import orjson
+except ImportError:  # 未安装 orjson 时回退到标准库 json
+    orjson = None
+
+try:
+    import simdjson
+except ImportError:  # 未安装 pysimdjson 时调用方改用 loads 解析
+    simdjson = None
+
+
+def loads(b: bytes) -> Any:
+    """解析 JSON 响应体（bytes），优先使用 orjson。"""
+    if orjson is not None:
+        return orjson.loads(b)
+    return json.loads(b)
+
+
+def dumps(obj: Any, indent: bool = False) -> bytes:
+    """
+    序列化为 UTF-8 JSON bytes，默认紧凑格式，indent=True 时 2 空格缩进。
+    优先使用 orjson（直接输出 UTF-8，无需 ensure_ascii=False 的转码）。
+    """
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0)
+        return orjson.dumps(obj, option=option)
+    if indent:
+        return json.dumps(obj, ensure_ascii=False, indent=2).encode("utf-8")
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+# simdjson.Parser 同一时刻只能持有一个文档且不可跨线程共享，因此每个线程复用自己的 parser
+_PARSER_LOCAL = threading.local()
+
+
+def get_simdjson_parser() -> "simdjson.Parser":
+    """
+    返回当前线程的 simdjson.Parser（需已安装 pysimdjson）。
+    parse 返回的惰性文档引用 parser 的缓冲区，必须在同一线程下一次 parse 前释放。
+    """
+    parser = getattr(_PARSER_LOCAL, "parser", None)
+    if parser is None:
+        parser = _PARSER_LOCAL.parser = simdjson.Parser()
+    return parser
+
+
+def build_session(pool_connections: int = 4, pool_maxsize: int = 10, max_retries: Any = 0) -> requests.Session:
+    """创建复用同一连接池（HTTP keep-alive）的 Session，避免每次请求重新进行 TCP+TLS 握手。"""
+    session = requests.Session()
+    session.mount("https://", HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=max_retries))
+    return session
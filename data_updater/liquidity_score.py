@@ -1,39 +1,126 @@
 # 按照polymarket官网计算score的程序，无法验证
 
 import argparse
+import atexit
+import functools
 import os
 import math
-from typing import Dict, Any, List, Tuple, Optional
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Any, List, Tuple, Optional
 
-import requests
+import numpy as np
+from cachetools import TTLCache, cached
+from cachetools.keys import hashkey
+
+# 兼容以文件路径直接运行：尝试从项目根导入 data_updater 包
+try:
+    from data_updater.http_utils import build_session, get_simdjson_parser, loads, simdjson
+except ModuleNotFoundError:
+    import sys
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from data_updater.http_utils import build_session, get_simdjson_parser, loads, simdjson
 
 
 ORDERBOOK_SUMMARY_URL = "https://clob.polymarket.com/orderbook-summary"
 MIDPOINT_URL = "https://clob.polymarket.com/midpoint"
 GAMMA_MARKETS_URL = "https://gamma-api.polymarket.com/markets"
 
+_SESSION = build_session()
+atexit.register(_SESSION.close)
+
+# 同一 token 的 orderbook/midpoint 在 TTL 内直接复用（被当作模块反复调用时省去整次网络往返）
+CACHE_TTL_SECONDS = 2.0
+_orderbook_cache: TTLCache = TTLCache(maxsize=1024, ttl=CACHE_TTL_SECONDS)
+_midpoint_cache: TTLCache = TTLCache(maxsize=1024, ttl=CACHE_TTL_SECONDS)
+_cache_lock = threading.Lock()
+
+
+def _token_key(token_id: str):
+    return hashkey(str(token_id))
+
 
 def to_float(x: Any, default: float = 0.0) -> float:
+    # 按精确类型分派：float/int 直接返回，常见的 API 字符串只在解析失败时走异常分支
+    t = type(x)
+    if t is float:
+        return x
+    if t is str:
+        if not x:
+            return default
+        try:
+            return float(x)
+        except ValueError:
+            return default
+    if t is int:
+        return float(x)
+    if x is None:
+        return default
     try:
         return float(x)
     except Exception:
         return default
 
 
+_LEVEL_KEYS = ("bids", "asks")
+
+
+def _materialize(key: str, v: Any) -> Any:
+    """将 simdjson 惰性值转换为普通 Python 对象；bids/asks 仅取 price/size。"""
+    if key in _LEVEL_KEYS:
+        return [(e.get("price"), e.get("size")) for e in v]
+    if isinstance(v, simdjson.Object):
+        return v.as_dict()
+    if isinstance(v, simdjson.Array):
+        return v.as_list()
+    return v
+
+
+def _parse_ob(content: bytes) -> Dict[str, Any]:
+    """
+    解析 orderbook-summary 响应体。
+    bids/asks 只保留 [(price, size)]（原始字符串），其余字段原样返回。
+    使用 simdjson 时直接从惰性文档读取 price/size，不为每个档位构建完整 dict；
+    返回前释放文档引用，parser 才能被下一次 parse 复用。
+    """
+    if simdjson is None:
+        data = loads(content)
+        return {
+            k: [(e.get("price"), e.get("size")) for e in v] if k in _LEVEL_KEYS else v
+            for k, v in data.items()
+        }
+
+    doc = get_simdjson_parser().parse(content)
+    ob = {k: _materialize(k, doc[k]) for k in doc.keys()}
+    del doc
+    return ob
+
+
+@cached(_orderbook_cache, key=_token_key, lock=_cache_lock)
 def fetch_orderbook_summary(token_id: str) -> Dict[str, Any]:
-    resp = requests.get(ORDERBOOK_SUMMARY_URL, params={"token_id": token_id}, timeout=20)
+    """返回 orderbook 摘要，bids/asks 为 [(price, size)] 字符串二元组列表。"""
+    resp = _SESSION.get(ORDERBOOK_SUMMARY_URL, params={"token_id": token_id}, timeout=20)
     resp.raise_for_status()
-    return resp.json()
+    return _parse_ob(resp.content)
 
 
+@cached(_midpoint_cache, key=_token_key, lock=_cache_lock)
 def fetch_midpoint(token_id: str) -> float:
-    resp = requests.get(MIDPOINT_URL, params={"token_id": token_id}, timeout=15)
+    resp = _SESSION.get(MIDPOINT_URL, params={"token_id": token_id}, timeout=15)
     resp.raise_for_status()
-    data = resp.json()
+    data = loads(resp.content)
     # API 返回 {"mid": "0.43"}
     return to_float(data.get("mid"))
 
 
+def invalidate(token_id: str) -> None:
+    """丢弃某个 token 已缓存的 orderbook 与 midpoint。"""
+    key = _token_key(token_id)
+    with _cache_lock:
+        _orderbook_cache.pop(key, None)
+        _midpoint_cache.pop(key, None)
+
+
 def utility_score(v_cents: float, s_cents: float, b_multiplier: float = 1.0) -> float:
     """S(v, s) = ((v - s)/v)^2 * b，当 s > v 时得分为 0。"""
     if s_cents < 0:
@@ -52,12 +139,37 @@ def score_side(orders: List[Tuple[float, float]], mid: float, v_cents: float, b:
     v_cents: 最大合格价差（单位：美分）
     b: 乘数（默认 1.0）
     """
-    total = 0.0
-    for price, size in orders:
-        s_cents = abs(price - mid) * 100.0
-        S = utility_score(v_cents, s_cents, b)
-        total += S * size
-    return total
+    arr = np.asarray(orders, dtype=np.float64).reshape(-1, 2)
+    return _score_arrays(arr[:, 0], arr[:, 1], mid, v_cents, b)
+
+
+def _score_arrays(prices: np.ndarray, sizes: np.ndarray, mid: float, v_cents: float, b: float) -> float:
+    """
+    score_side 的向量化实现：sum(S(v, s) * size)，s > v 的层得分为 0。
+    与 utility_score 等价，但将 1/v 与乘数 b 提到循环外，逐层只做一次乘加。
+    """
+    # 没有档位时得分为 0；v <= 0 时任何档位都有 s > v，同样为 0（且避免 1/v 除零）
+    if not sizes.size or v_cents <= 0:
+        return 0.0
+    inv_v = 1.0 / v_cents
+    ratio = np.maximum(v_cents - np.abs(prices - mid) * 100.0, 0.0) * inv_v
+    return b * float((ratio * ratio) @ sizes)
+
+
+def _levels_array(levels: List[Tuple[Any, Any]]) -> Tuple[np.ndarray, np.ndarray]:
+    """将 orderbook 的 [(price, size)] 一次性转换为 float64 的 prices/sizes 数组。"""
+    n = len(levels)
+    prices = np.fromiter((to_float(p) for p, _ in levels), dtype=np.float64, count=n)
+    sizes = np.fromiter((to_float(s) for _, s in levels), dtype=np.float64, count=n)
+    return prices, sizes
+
+
+def _book_side_score(levels: List[Tuple[Any, Any]], mid: float, v_cents: float, b: float, min_size: float) -> float:
+    """过滤掉 size < min_size 或价差超过 v 的层后，计算该侧 orderbook 的得分。"""
+    prices, sizes = _levels_array(levels)
+    # 价差超过 v 的层在 _score_arrays 中得分为 0，这里只需按 min_size 过滤
+    mask = sizes >= min_size
+    return _score_arrays(prices[mask], sizes[mask], mid, v_cents, b)
 
 
 def compute_qmin(q_bid: float, q_ask: float, mid: float, c_scale: float = 3.0) -> float:
@@ -84,15 +196,11 @@ def propose_orders(mid: float, tick_size: float, v_cents: float, min_size: float
     # 生成价格层（不含 midpoint 本身），确保在 [0,1] 边界内
     n_steps = max(1, int(math.floor(v_dollars / tick_size)))
 
-    bid_prices = []
-    ask_prices = []
-    for i in range(1, n_steps + 1):
-        bp = mid - i * tick_size
-        ap = mid + i * tick_size
-        if 0.0 < bp < 1.0:
-            bid_prices.append(bp)
-        if 0.0 < ap <= 1.0:
-            ask_prices.append(ap)
+    offsets = np.arange(1, n_steps + 1) * tick_size
+    bid_prices = mid - offsets
+    ask_prices = mid + offsets
+    bid_prices = bid_prices[(bid_prices > 0.0) & (bid_prices < 1.0)]
+    ask_prices = ask_prices[(ask_prices > 0.0) & (ask_prices <= 1.0)]
 
     orders = {"bids": [], "asks": []}
 
@@ -108,24 +216,21 @@ def propose_orders(mid: float, tick_size: float, v_cents: float, min_size: float
         budget_ask = usdc
 
     # 按层均分 USDC，然后转换为 shares；不满足最小 size 的层剔除
-    def allocate(prices: List[float], budget: float) -> List[Tuple[float, float]]:
-        if budget <= 0 or not prices:
+    def allocate(prices: np.ndarray, budget: float) -> List[Tuple[float, float]]:
+        if budget <= 0 or prices.size == 0:
             return []
-        notional_each = budget / len(prices)
-        usable: List[Tuple[float, float]] = []
-        for p in prices:
-            size = notional_each / p
-            if size >= min_size:
-                usable.append((p, size))
-        # 若无任何层满足最小 size，则尝试用整笔预算在最近一层下单
-        if not usable:
-            # 选择最近层（距离 mid 最近）
-            closest = min(prices, key=lambda x: abs(x - mid)) if prices else None
-            if closest is not None:
-                size = budget / closest
-                if size >= min_size:
-                    usable.append((closest, size))
-        return usable
+        notional_each = budget / prices.size
+        sizes = notional_each / prices
+        mask = sizes >= min_size
+        if mask.any():
+            return list(zip(prices[mask].tolist(), sizes[mask].tolist()))
+        # 若无任何层满足最小 size，则尝试用整笔预算在最近一层（距离 mid 最近）下单。
+        # 价格层按 mid ± i*tick（i 递增）生成，边界过滤只会截掉远端，因此第 0 层即最近层
+        closest = float(prices[0])
+        size = budget / closest
+        if size >= min_size:
+            return [(closest, size)]
+        return []
 
     orders["bids"] = allocate(bid_prices, budget_bid)
     orders["asks"] = allocate(ask_prices, budget_ask)
@@ -137,14 +242,8 @@ def summarize_current_book(ob: Dict[str, Any], mid: float, v_cents: float, b: fl
     计算当前 orderbook 的近似得分（仅该 token 的 bids/asks），过滤掉 size < min_size 或价差超过 v 的条目。
     返回 (q_bids, q_asks, qmin)
     """
-    bids = [(to_float(e.get("price")), to_float(e.get("size"))) for e in ob.get("bids", [])]
-    asks = [(to_float(e.get("price")), to_float(e.get("size"))) for e in ob.get("asks", [])]
-
-    bids = [(p, s) for (p, s) in bids if s >= min_size and abs(p - mid) * 100.0 <= v_cents]
-    asks = [(p, s) for (p, s) in asks if s >= min_size and abs(p - mid) * 100.0 <= v_cents]
-
-    q_bids = score_side(bids, mid, v_cents, b)
-    q_asks = score_side(asks, mid, v_cents, b)
+    q_bids = _book_side_score(ob.get("bids", []), mid, v_cents, b, min_size)
+    q_asks = _book_side_score(ob.get("asks", []), mid, v_cents, b, min_size)
     qmin = compute_qmin(q_bids, q_asks, mid)
     return q_bids, q_asks, qmin
 
@@ -153,9 +252,9 @@ def fetch_markets_page(limit: int = 500, offset: int = 0, extra_params: Optional
     params = {"limit": limit, "offset": offset}
     if extra_params:
         params.update(extra_params)
-    resp = requests.get(GAMMA_MARKETS_URL, params=params, timeout=30)
+    resp = _SESSION.get(GAMMA_MARKETS_URL, params=params, timeout=30)
     resp.raise_for_status()
-    data = resp.json()
+    data = loads(resp.content)
     if isinstance(data, dict) and "markets" in data:
         return data["markets"]
     if isinstance(data, list):
@@ -163,32 +262,84 @@ def fetch_markets_page(limit: int = 500, offset: int = 0, extra_params: Optional
     return []
 
 
-def find_market_by_token_id(token_id: str, max_pages: int = 20, page_size: int = 500) -> Optional[Dict[str, Any]]:
+def _market_token_ids(m: Dict[str, Any]) -> List[str]:
+    """读取市场的 clobTokenIds；Gamma 通常以 JSON 字符串形式返回。"""
+    cti = m.get("clobTokenIds") or m.get("clob_token_ids")
+    if isinstance(cti, str):
+        try:
+            cti = loads(cti)
+        except ValueError:
+            return []
+    if not isinstance(cti, list):
+        return []
+    return [str(t) for t in cti]
+
+
+@functools.lru_cache(maxsize=1)
+def _load_all_markets(max_pages: int = 20, page_size: int = 500) -> Tuple[Dict[Any, Dict[str, Any]], Dict[str, Dict[str, Any]], Dict[str, Dict[str, Any]]]:
+    """
+    分页拉取 Gamma markets（最多 max_pages 页），一次性建立 id / slug / token_id -> market 索引。
+    结果在进程内缓存，两个 find_market_by_* 共用同一份数据；长时间运行的进程可调用
+    clear_markets_cache() 刷新。同一键出现多次时保留最先出现的市场，与逐页扫描的结果一致。
+    """
+    by_id: Dict[Any, Dict[str, Any]] = {}
+    by_slug: Dict[str, Dict[str, Any]] = {}
+    by_token: Dict[str, Dict[str, Any]] = {}
     offset = 0
     for _ in range(max_pages):
         markets = fetch_markets_page(limit=page_size, offset=offset)
         if not markets:
             break
         for m in markets:
-            cti = m.get("clobTokenIds") or m.get("clob_token_ids")
-            if cti and token_id in cti:
-                return m
+            if m.get("id") is not None:
+                by_id.setdefault(m["id"], m)
+            if m.get("slug"):
+                by_slug.setdefault(m["slug"], m)
+            for tid in _market_token_ids(m):
+                by_token.setdefault(tid, m)
         offset += page_size
+    return by_id, by_slug, by_token
+
+
+def clear_markets_cache() -> None:
+    """清空 _load_all_markets 的进程内缓存。"""
+    _load_all_markets.cache_clear()
+
+
+def _fetch_filtered_market(param: str, value: str, matches: Callable[[Dict[str, Any]], bool]) -> Optional[Dict[str, Any]]:
+    """
+    直接用 Gamma 的过滤参数查询单个市场（1 次请求）。
+    仅返回确实匹配的结果；若 API 忽略了该参数，返回 None 交由分页索引兜底。
+    """
+    for m in fetch_markets_page(limit=1, offset=0, extra_params={param: value}):
+        if matches(m):
+            return m
     return None
 
 
+def find_market_by_token_id(token_id: str, max_pages: int = 20, page_size: int = 500) -> Optional[Dict[str, Any]]:
+    token_id = str(token_id)
+    market = _fetch_filtered_market("clob_token_ids", token_id, lambda m: token_id in _market_token_ids(m))
+    if market:
+        return market
+    _, _, by_token = _load_all_markets(max_pages, page_size)
+    return by_token.get(token_id)
+
+
 def find_market_by_id_or_slug(market_id: Optional[str] = None, slug: Optional[str] = None, max_pages: int = 20, page_size: int = 500) -> Optional[Dict[str, Any]]:
-    offset = 0
-    for _ in range(max_pages):
-        markets = fetch_markets_page(limit=page_size, offset=offset)
-        if not markets:
-            break
-        for m in markets:
-            if market_id and m.get("id") == market_id:
-                return m
-            if slug and m.get("slug") == slug:
-                return m
-        offset += page_size
+    if market_id:
+        market = _fetch_filtered_market("id", market_id, lambda m: str(m.get("id")) == str(market_id))
+        if market:
+            return market
+    if slug:
+        market = _fetch_filtered_market("slug", slug, lambda m: m.get("slug") == slug)
+        if market:
+            return market
+    by_id, by_slug, _ = _load_all_markets(max_pages, page_size)
+    if market_id and market_id in by_id:
+        return by_id[market_id]
+    if slug and slug in by_slug:
+        return by_slug[slug]
     return None
 
 
@@ -200,21 +351,15 @@ def get_market_and_tokens(token_id: Optional[str] = None, market_id: Optional[st
         market = find_market_by_token_id(token_id)
     if not market:
         raise ValueError("未能在 Gamma markets 找到对应市场")
-    token_ids = market.get("clobTokenIds") or market.get("clob_token_ids") or []
+    token_ids = _market_token_ids(market)
     if not token_ids or len(token_ids) < 2:
         raise ValueError("市场未返回两个 clobTokenIds")
     return market, token_ids[:2]
 
 
 def token_contribution(ob: Dict[str, Any], mid: float, v_cents: float, b: float, min_size: float) -> Tuple[float, float, float]:
-    bids = [(to_float(e.get("price")), to_float(e.get("size"))) for e in ob.get("bids", [])]
-    asks = [(to_float(e.get("price")), to_float(e.get("size"))) for e in ob.get("asks", [])]
-
-    bids = [(p, s) for (p, s) in bids if s >= min_size and abs(p - mid) * 100.0 <= v_cents]
-    asks = [(p, s) for (p, s) in asks if s >= min_size and abs(p - mid) * 100.0 <= v_cents]
-
-    q_bids = score_side(bids, mid, v_cents, b)
-    q_asks = score_side(asks, mid, v_cents, b)
+    q_bids = _book_side_score(ob.get("bids", []), mid, v_cents, b, min_size)
+    q_asks = _book_side_score(ob.get("asks", []), mid, v_cents, b, min_size)
     q_token = q_bids + q_asks
     return q_bids, q_asks, q_token
 
@@ -226,6 +371,16 @@ def compute_qmin_tokens(q_one: float, q_two: float, mid: float, c_scale: float =
         return min(q_one, q_two)
 
 
+def compute_qmin_tokens_batch(q_ones: List[float], q_twos: List[float], mid: float, c_scale: float = 3.0) -> np.ndarray:
+    """compute_qmin_tokens 的批量版本：对多组 (Qone, Qtwo) 一次性计算 Qmin，返回数组。"""
+    q_ones_arr = np.asarray(q_ones, dtype=np.float64)
+    q_twos_arr = np.asarray(q_twos, dtype=np.float64)
+    q_min = np.minimum(q_ones_arr, q_twos_arr)
+    if 0.10 <= mid <= 0.90:
+        return np.maximum(q_min, np.maximum(q_ones_arr / c_scale, q_twos_arr / c_scale))
+    return q_min
+
+
 def main():
     parser = argparse.ArgumentParser(description="基于 Polymarket 奖励方法的订单得分近似计算（双 token 版本，自动解析 clobTokenIds）")
     parser.add_argument("token_id", type=str, help="token id（若提供 --market_id 或 --slug，将自动忽略此值用于发现市场）")
@@ -267,11 +422,16 @@ def main():
 
     token_a, token_b = token_ids[0], token_ids[1]
 
-    # 拉取两个 token 的 orderbook 与 midpoint
-    ob_a = fetch_orderbook_summary(token_a)
-    ob_b = fetch_orderbook_summary(token_b)
-    mid_a = fetch_midpoint(token_a)
-    mid_b = fetch_midpoint(token_b)
+    # 并发拉取两个 token 的 orderbook 与 midpoint（I/O 等待期间释放 GIL，总耗时约为一次 RTT）
+    with ThreadPoolExecutor(max_workers=4) as ex:
+        f_ob_a = ex.submit(fetch_orderbook_summary, token_a)
+        f_ob_b = ex.submit(fetch_orderbook_summary, token_b)
+        f_mid_a = ex.submit(fetch_midpoint, token_a)
+        f_mid_b = ex.submit(fetch_midpoint, token_b)
+    ob_a = f_ob_a.result()
+    ob_b = f_ob_b.result()
+    mid_a = f_mid_a.result()
+    mid_b = f_mid_b.result()
 
     tick_a = to_float(ob_a.get("tick_size"), 0.01)
     tick_b = to_float(ob_b.get("tick_size"), 0.01)
@@ -283,15 +443,9 @@ def main():
     print(f"TokenA={token_a} mid={mid_a:.4f} tick_size={tick_a} min_order_size={min_a} neg_risk={neg_a} v_cents={v_cents}")
     print(f"TokenB={token_b} mid={mid_b:.4f} tick_size={tick_b} min_order_size={min_b} neg_risk={neg_b} v_cents={v_cents}")
 
-    # 当前 orderbook 两个 token 的贡献与组合 Qmin
+    # 当前 orderbook 两个 token 的贡献
     qb_cur_a, qa_cur_a, qsum_cur_a = token_contribution(ob_a, mid_a, v_cents, b_mult, min_a)
     qb_cur_b, qa_cur_b, qsum_cur_b = token_contribution(ob_b, mid_b, v_cents, b_mult, min_b)
-    qmin_cur_tokens = compute_qmin_tokens(qsum_cur_a, qsum_cur_b, mid_a, c_scale)
-
-    print(f"当前订单得分（每 token）：")
-    print(f"  TokenA: Q_bids={qb_cur_a:.4f} Q_asks={qa_cur_a:.4f} Q_token={qsum_cur_a:.4f}")
-    print(f"  TokenB: Q_bids={qb_cur_b:.4f} Q_asks={qa_cur_b:.4f} Q_token={qsum_cur_b:.4f}")
-    print(f"组合 Qmin_current={qmin_cur_tokens:.4f}")
 
     # 拟下单：将 USDC 在两个 token 间均分
     usdc_each = usdc / 2.0
@@ -300,7 +454,23 @@ def main():
 
     q_user_a = score_side(prop_a["bids"], mid_a, v_cents, b_mult) + score_side(prop_a["asks"], mid_a, v_cents, b_mult)
     q_user_b = score_side(prop_b["bids"], mid_b, v_cents, b_mult) + score_side(prop_b["asks"], mid_b, v_cents, b_mult)
-    qmin_user_tokens = compute_qmin_tokens(q_user_a, q_user_b, mid_a, c_scale)
+
+    # 合计（当前+我们）
+    qsum_total_a = qsum_cur_a + q_user_a
+    qsum_total_b = qsum_cur_b + q_user_b
+
+    # 当前 / 我们 / 合计 三组组合 Qmin 一次算出
+    qmin_cur_tokens, qmin_user_tokens, qmin_total = compute_qmin_tokens_batch(
+        [qsum_cur_a, q_user_a, qsum_total_a],
+        [qsum_cur_b, q_user_b, qsum_total_b],
+        mid_a,
+        c_scale,
+    ).tolist()
+
+    print(f"当前订单得分（每 token）：")
+    print(f"  TokenA: Q_bids={qb_cur_a:.4f} Q_asks={qa_cur_a:.4f} Q_token={qsum_cur_a:.4f}")
+    print(f"  TokenB: Q_bids={qb_cur_b:.4f} Q_asks={qa_cur_b:.4f} Q_token={qsum_cur_b:.4f}")
+    print(f"组合 Qmin_current={qmin_cur_tokens:.4f}")
 
     print(f"拟下单层数（均分 USDC）：")
     print(f"  TokenA bids={len(prop_a['bids'])} asks={len(prop_a['asks'])}")
@@ -320,10 +490,6 @@ def main():
     print(f"组合 Qmin_user={qmin_user_tokens:.4f}")
 
     # 合计 Qmin（当前+我们），以及近似占比
-    qsum_total_a = qsum_cur_a + q_user_a
-    qsum_total_b = qsum_cur_b + q_user_b
-    qmin_total = compute_qmin_tokens(qsum_total_a, qsum_total_b, mid_a, c_scale)
-
     denom = qmin_user_tokens + qmin_cur_tokens
     share = (qmin_user_tokens / denom) if denom > 0 else 0.0
     print(f"合计 Qmin_total={qmin_total:.4f}")
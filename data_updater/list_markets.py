@@ -2,25 +2,37 @@
 # 可以work
 
 import argparse
-import json
 import os
-from typing import Any, Dict, List, Optional
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, Iterator, List, Optional
 from datetime import datetime, timezone, timedelta
 
 import requests
+from urllib3.util.retry import Retry
 
 # 兼容以文件路径直接运行：尝试从项目根导入 data_updater 包
 try:
+    from data_updater.http_utils import build_session, dumps, loads
     from data_updater.trading_utils import get_clob_client
 except ModuleNotFoundError:
     import sys
     ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
     if ROOT not in sys.path:
         sys.path.append(ROOT)
+    from data_updater.http_utils import build_session, dumps, loads
     from data_updater.trading_utils import get_clob_client
 
+try:
+    from py_clob_client.clob_types import BookParams
+except ImportError:  # 缺少 py_clob_client 时 orderbooks 只走 HTTP 批量接口
+    BookParams = None
+
 # 批量获取多个 order books 的 CLOB REST 端点（参考官方文档：POST /<clob-endpoint>/books）
 CLOB_BOOKS_URL = "https://clob.polymarket.com/books"
+# Polygon USDC 地址（小写）；接口返回的 asset_address 大小写不固定，统一小写后比较
+USDC_ADDR_LOWER = "0x2791bca1f2de4661ed88a30c99a7a9449aa84174"
 
 
 def ensure_data_dir(path: str = "data") -> None:
@@ -37,14 +49,15 @@ def pick(value: Dict[str, Any], keys: List[str], default: Any = None) -> Any:
 
 def extract_reward_fields(m: Dict[str, Any]) -> Dict[str, Any]:
     rewards = m.get("rewards") or {}
-    rates = rewards.get("rates") or []
-    # 优先选 USDC 的 daily rate（Polygon USDC 地址）
-    usdc_addr = "0x2791Bca1f2de4661ED88A30C99A7a9449Aa84174"
+    rates = rewards.get("rates")
+    # 优先选 USDC 的 daily rate
     rewards_daily_rate = None
-    for r in rates:
-        if r.get("asset_address") == usdc_addr and r.get("rewards_daily_rate") is not None:
-            rewards_daily_rate = r.get("rewards_daily_rate")
-            break
+    if rates:
+        for r in rates:
+            rate = r.get("rewards_daily_rate")
+            if rate is not None and (r.get("asset_address") or "").lower() == USDC_ADDR_LOWER:
+                rewards_daily_rate = rate
+                break
     return {
         "rewards_daily_rate": rewards_daily_rate,
         "min_size": rewards.get("min_size"),
@@ -52,14 +65,17 @@ def extract_reward_fields(m: Dict[str, Any]) -> Dict[str, Any]:
     }
 
 
-def build_market_record(m: Dict[str, Any]) -> Dict[str, Any]:
+def build_market_record(m: Dict[str, Any], end_iso: Optional[str] = None) -> Dict[str, Any]:
+    """end_iso: 调用方已取得的结束时间字符串；为 None 时从 m 中读取。"""
     reward_fields = extract_reward_fields(m)
+    if end_iso is None:
+        end_iso = pick(m, ["end_date_iso", "endDateIso", "endDate"], None)
     record: Dict[str, Any] = {
         "question": m.get("question"),
         "market_slug": pick(m, ["market_slug", "slug"], None),
         "condition_id": m.get("condition_id"),
         "question_id": m.get("question_id"),
-        "end_date_iso": pick(m, ["end_date_iso", "endDateIso", "endDate"], None),
+        "end_date_iso": end_iso,
         "neg_risk": m.get("neg_risk"),
         "minimum_order_size": m.get("minimum_order_size"),
         "minimum_tick_size": m.get("minimum_tick_size"),
@@ -81,21 +97,47 @@ def build_market_record(m: Dict[str, Any]) -> Dict[str, Any]:
     return record
 
 
+_PAGES_DONE = object()
+
+
+def iter_sampling_pages(client, prefetch: int = 2) -> Iterator[List[Dict[str, Any]]]:
+    """
+    逐页产出 get_sampling_markets 的 data。
+    cursor 由服务端给出、无法并行请求，但后台线程会在调用方处理当前页时继续拉取下一页，
+    使网络等待与处理重叠（调用方应逐页做筛选等处理，见 main）；prefetch 限制最多预取的页数。
+    """
+    pages: "queue.Queue[Any]" = queue.Queue(maxsize=prefetch)
+
+    def produce() -> None:
+        cursor = ""
+        try:
+            while True:
+                try:
+                    resp = client.get_sampling_markets(next_cursor=cursor)
+                    data = resp.get("data", [])
+                    cursor = resp.get("next_cursor")
+                    if isinstance(data, list):
+                        pages.put(data)
+                    if cursor is None:
+                        break
+                except Exception as ex:
+                    print(f"分页获取失败：{ex}")
+                    break
+        finally:
+            pages.put(_PAGES_DONE)
+
+    threading.Thread(target=produce, name="sampling-markets-prefetch", daemon=True).start()
+    while True:
+        page = pages.get()
+        if page is _PAGES_DONE:
+            return
+        yield page
+
+
 def get_all_markets_sampling(client) -> List[Dict[str, Any]]:
-    cursor = ""
     results: List[Dict[str, Any]] = []
-    while True:
-        try:
-            resp = client.get_sampling_markets(next_cursor=cursor)
-            data = resp.get("data", [])
-            cursor = resp.get("next_cursor")
-            if isinstance(data, list):
-                results.extend(data)
-            if cursor is None:
-                break
-        except Exception as ex:
-            print(f"分页获取失败：{ex}")
-            break
+    for page in iter_sampling_pages(client):
+        results.extend(page)
     return results
 
 
@@ -108,117 +150,180 @@ def parse_iso_to_utc(iso_str: Optional[str]) -> Optional[datetime]:
         s = s[:-1] + "+00:00"
     try:
         dt = datetime.fromisoformat(s)
-        if dt.tzinfo is None:
-            dt = dt.replace(tzinfo=timezone.utc)
-        else:
-            dt = dt.astimezone(timezone.utc)
-        return dt
+        tz = dt.tzinfo
+        # 常见情况：输入以 'Z'/+00:00 结尾，fromisoformat 直接给出 timezone.utc，无需再转换
+        if tz is timezone.utc:
+            return dt
+        if tz is None:
+            return dt.replace(tzinfo=timezone.utc)
+        return dt.astimezone(timezone.utc)
     except Exception:
         return None
 
 
-def fetch_order_books_bulk(token_ids: List[str], batch_size: int = 10, timeout: int = 20, debug: bool = False, client=None) -> Dict[str, Dict[str, Any]]:
+def coerce_levels(levels: Any) -> List[Dict[str, Any]]:
+    """
+    将 bids/asks 的层级统一转换为可 JSON 序列化的字典数组 {price, size}。
+    同一侧的层级结构一致，按首个元素的类型选择字典（HTTP）或对象属性（客户端）的快速路径；
+    price/size 缺失的非预期层级会被跳过。接口通常已返回字符串，此时直接复用、不再调用 str()。
+    """
+    if not levels:
+        return []
+    _str = str
+    if isinstance(levels[0], dict):
+        return [
+            {
+                "price": price if type(price) is _str else _str(price),
+                "size": size if type(size) is _str else _str(size),
+            }
+            for lv in levels
+            for price, size in ((lv.get("price"), lv.get("size")),)
+            if price is not None and size is not None
+        ]
+    _getattr = getattr
+    return [
+        {
+            "price": price if type(price) is _str else _str(price),
+            "size": size if type(size) is _str else _str(size),
+        }
+        for lv in levels
+        for price, size in ((_getattr(lv, "price", None), _getattr(lv, "size", None)),)
+        if price is not None and size is not None
+    ]
+
+
+def build_books_session(pool_maxsize: int = 32) -> requests.Session:
+    """
+    创建用于批量 books 请求的 Session：连接池复用 keep-alive，对连接错误做少量重试。
+    Accept-Encoding 沿用 requests 的默认值（urllib3 会按已安装的解码库自动加入 br/zstd），并透明解压。
+    """
+    session = build_session(pool_connections=8, pool_maxsize=pool_maxsize, max_retries=Retry(total=2, backoff_factor=0.2))
+    return session
+
+
+def _coerce_client_books(books_arr: Any) -> Dict[str, Dict[str, Any]]:
+    """将客户端 get_order_books 的返回（元素具有属性访问或字典访问）转换为 token_id -> {bids, asks}。"""
+    result: Dict[str, Dict[str, Any]] = {}
+    for ob in books_arr:
+        # 兼容对象或字典
+        tid = getattr(ob, "asset_id", None) or getattr(ob, "token_id", None) or (
+            ob.get("asset_id") if isinstance(ob, dict) else None
+        ) or (ob.get("token_id") if isinstance(ob, dict) else None)
+        if not tid:
+            continue
+        bids = getattr(ob, "bids", None) if not isinstance(ob, dict) else ob.get("bids")
+        asks = getattr(ob, "asks", None) if not isinstance(ob, dict) else ob.get("asks")
+        result[str(tid)] = {
+            "bids": coerce_levels(bids),
+            "asks": coerce_levels(asks),
+        }
+    return result
+
+
+def _fetch_one_batch(session: requests.Session, batch: List[str], timeout: int, debug: bool, client=None) -> Dict[str, Dict[str, Any]]:
+    """获取一批 token 的 orderbooks；失败时打印错误并返回空结果，不影响其他批次。"""
+    result: Dict[str, Dict[str, Any]] = {}
+    try:
+        # 优先使用官方客户端以确保请求负载结构正确
+        if client is not None and BookParams is not None:
+            try:
+                books_arr = client.get_order_books(params=[BookParams(token_id=tid) for tid in batch])
+                if debug:
+                    print(f"客户端 get_order_books 返回 {len(books_arr)} 条")
+                # 成功使用客户端则跳过 HTTP
+                return _coerce_client_books(books_arr)
+            except Exception as ex_client:
+                if debug:
+                    print(f"客户端 get_order_books 失败，回退 HTTP：{ex_client}")
+
+        # HTTP 回退遵循批量接口示例：请求体为 JSON 数组，而不是包裹在对象中的 params 字段
+        payload = [{"token_id": tid} for tid in batch]
+        if debug:
+            print(f"请求批次（{len(batch)}）: 首个 token_id={batch[0]}")
+            print(f"POST {CLOB_BOOKS_URL} payload 列表长度: {len(payload)} 示例项: {payload[0] if payload else None}")
+        resp = session.post(CLOB_BOOKS_URL, json=payload, timeout=timeout)
+        resp.raise_for_status()
+        content = resp.content
+        # 空批次直接返回，省去解析与后续遍历
+        if not content or content.strip() in (b"[]", b"{}"):
+            return result
+        # 每个档位的 price/size 都会被读取，惰性解析省不下什么，直接用 orjson 整体解析
+        resp_json = loads(content)
+        if debug:
+            print(f"响应类型: {type(resp_json)}")
+            if isinstance(resp_json, dict):
+                print(f"响应字典键: {list(resp_json.keys())}")
+            else:
+                print(f"响应长度: {len(resp_json) if hasattr(resp_json, '__len__') else 'N/A'}")
+
+        # 兼容多种响应结构：数组或字典中的某个键
+        if isinstance(resp_json, list):
+            books_arr = resp_json
+        elif isinstance(resp_json, dict):
+            books_arr = resp_json.get("books") or resp_json.get("data") or resp_json.get("orderbooks") or []
+        else:
+            books_arr = []
+
+        if debug:
+            print(f"解析后的 books 条目数: {len(books_arr)}")
+            if books_arr:
+                sample = books_arr[0]
+                print(f"示例条目键: {list(sample.keys())}")
+                print(f"示例 asset_id: {sample.get('asset_id')} bids_len={len(sample.get('bids') or [])} asks_len={len(sample.get('asks') or [])}")
+
+        for ob in books_arr:
+            tid = ob.get("asset_id") or ob.get("token_id")
+            if not tid:
+                continue
+            # coerce_levels 自行处理 None/空列表
+            bids = ob.get("bids")
+            asks = ob.get("asks")
+            result[str(tid)] = {
+                "bids": coerce_levels(bids),
+                "asks": coerce_levels(asks),
+            }
+    except Exception as ex:
+        print(f"批量获取 orderbooks 失败（batch 首个 token: {batch[0]}）：{ex}")
+    return result
+
+
+def fetch_order_books_bulk(token_ids: List[str], batch_size: int = 10, timeout: int = 20, debug: bool = False, client=None, session: Optional[requests.Session] = None, max_workers: int = 16) -> Dict[str, Dict[str, Any]]:
     """
     通过 CLOB 批量接口获取多个 token 的 orderbook summaries。
+    各批次在线程池中并发请求（纯 I/O 等待），墙钟时间约为一次 RTT 而非 批次数 × RTT。
     返回映射：token_id -> { bids: [...], asks: [...] }
     文档：POST /<clob-endpoint>/books
     """
     result: Dict[str, Dict[str, Any]] = {}
-    # 过滤掉 None
-    token_ids = [str(tid) for tid in token_ids if tid]
-    def coerce_levels(levels: Any) -> List[Dict[str, Any]]:
-        """将 bids/asks 的层级统一转换为可 JSON 序列化的字典数组 {price, size}。"""
-        out: List[Dict[str, Any]] = []
-        if not levels:
-            return out
-        for lv in levels:
-            if isinstance(lv, dict):
-                price = lv.get("price")
-                size = lv.get("size")
-            else:
-                price = getattr(lv, "price", None)
-                size = getattr(lv, "size", None)
-            if price is None or size is None:
-                # 跳过非预期结构
-                continue
-            out.append({"price": str(price), "size": str(size)})
-        return out
+    # 过滤掉 None，并按首次出现顺序去重，同一 orderbook 不会被请求两次、批次也保持满载
+    token_ids = list(dict.fromkeys(str(tid) for tid in token_ids if tid))
+    if not token_ids:
+        return result
 
-    for i in range(0, len(token_ids), batch_size):
-        batch = token_ids[i : i + batch_size]
-        if not batch:
-            continue
+    # 有客户端时先用一次请求取全部 token；失败（如服务端拒绝过大的请求）再回退到分批并发
+    if client is not None and BookParams is not None:
         try:
-            # 优先使用官方客户端以确保请求负载结构正确
-            if client is not None:
-                try:
-                    from py_clob_client.clob_types import BookParams
-                    params = [BookParams(token_id=tid) for tid in batch]
-                    books_arr = client.get_order_books(params=params)
-                    if debug:
-                        print(f"客户端 get_order_books 返回 {len(books_arr)} 条")
-                    # books_arr 是列表，元素具有属性访问或字典访问
-                    for ob in books_arr:
-                        # 兼容对象或字典
-                        tid = getattr(ob, "asset_id", None) or getattr(ob, "token_id", None) or (
-                            ob.get("asset_id") if isinstance(ob, dict) else None
-                        ) or (ob.get("token_id") if isinstance(ob, dict) else None)
-                        if not tid:
-                            continue
-                        bids = getattr(ob, "bids", None) if not isinstance(ob, dict) else ob.get("bids")
-                        asks = getattr(ob, "asks", None) if not isinstance(ob, dict) else ob.get("asks")
-                        result[str(tid)] = {
-                            "bids": coerce_levels(bids),
-                            "asks": coerce_levels(asks),
-                        }
-                    # 成功使用客户端则跳过 HTTP 直接进入下一批
-                    continue
-                except Exception as ex_client:
-                    if debug:
-                        print(f"客户端 get_order_books 失败，回退 HTTP：{ex_client}")
-
-            # HTTP 回退遵循批量接口示例：请求体为 JSON 数组，而不是包裹在对象中的 params 字段
-            payload = [{"token_id": tid} for tid in batch]
+            books_arr = client.get_order_books(params=[BookParams(token_id=tid) for tid in token_ids])
             if debug:
-                print(f"请求批次（{len(batch)}）: 首个 token_id={batch[0]}")
-                print(f"POST {CLOB_BOOKS_URL} payload 列表长度: {len(payload)} 示例项: {payload[0] if payload else None}")
-            resp = requests.post(CLOB_BOOKS_URL, json=payload, timeout=timeout)
-            resp.raise_for_status()
-            resp_json = resp.json()
+                print(f"客户端单次 get_order_books 返回 {len(books_arr)} 条")
+            return _coerce_client_books(books_arr)
+        except Exception as ex_client:
             if debug:
-                print(f"响应类型: {type(resp_json)}")
-                if isinstance(resp_json, dict):
-                    print(f"响应字典键: {list(resp_json.keys())}")
-                else:
-                    print(f"响应长度: {len(resp_json) if hasattr(resp_json, '__len__') else 'N/A'}")
-
-            # 兼容多种响应结构：数组或字典中的某个键
-            if isinstance(resp_json, list):
-                books_arr = resp_json
-            elif isinstance(resp_json, dict):
-                books_arr = resp_json.get("books") or resp_json.get("data") or resp_json.get("orderbooks") or []
-            else:
-                books_arr = []
+                print(f"客户端单次 get_order_books 失败，回退分批：{ex_client}")
 
-            if debug:
-                print(f"解析后的 books 条目数: {len(books_arr)}")
-                if books_arr:
-                    sample = books_arr[0]
-                    print(f"示例条目键: {list(sample.keys())}")
-                    print(f"示例 asset_id: {sample.get('asset_id')} bids_len={len(sample.get('bids') or [])} asks_len={len(sample.get('asks') or [])}")
-
-            for ob in books_arr:
-                tid = ob.get("asset_id") or ob.get("token_id")
-                if not tid:
-                    continue
-                result[str(tid)] = {
-                    "bids": coerce_levels(ob.get("bids") or []),
-                    "asks": coerce_levels(ob.get("asks") or []),
-                }
-        except Exception as ex:
-            print(f"批量获取 orderbooks 失败（batch 首个 token: {batch[0]}）：{ex}")
-            # 遇到错误时继续处理后续批次
-            continue
+    batches = [token_ids[i : i + batch_size] for i in range(0, len(token_ids), batch_size)]
+
+    own_session = session is None
+    if own_session:
+        session = build_books_session()
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(batches)))) as ex:
+            futures = [ex.submit(_fetch_one_batch, session, batch, timeout, debug, client) for batch in batches]
+            for fut in as_completed(futures):
+                result.update(fut.result())
+    finally:
+        if own_session:
+            session.close()
     return result
 
 
@@ -258,42 +363,48 @@ def main():
 
     ensure_data_dir(os.path.dirname(args.out) or "data")
 
-    markets = get_all_markets_sampling(client)
+    # 按要求筛选：accepting_orders=True 且 end_date_iso ∈ [now-24h, now+args.hours]，now 沿用开头取得的时间
+    forward_hours = max(0.0, args.hours)
+    start_cutoff = now_utc - timedelta(hours=24)
+    end_cutoff = now_utc + timedelta(hours=forward_hours)
+    # 逐页单次遍历：筛选、构造记录（仅对筛选结果）并收集 token_id 以批量获取 orderbooks；
+    # 主线程处理当前页时，iter_sampling_pages 的后台线程已在拉取下一页
+    markets: List[Dict[str, Any]] = []
+    records: List[Dict[str, Any]] = []
+    all_token_ids: List[str] = []
+    for page in iter_sampling_pages(client):
+        markets.extend(page)
+        for m in page:
+            # 先做廉价的 accepting_orders 判断，不接单的市场无需解析日期
+            if not m.get("accepting_orders"):
+                continue
+            end_iso = pick(m, ["end_date_iso", "endDateIso", "endDate"], None)
+            end_dt = parse_iso_to_utc(end_iso)
+            if end_dt is None or not (start_cutoff <= end_dt <= end_cutoff):
+                continue
+            r = build_market_record(m, end_iso=end_iso)
+            records.append(r)
+            for t in r["tokens"]:
+                tid = t.get("token_id")
+                if tid:
+                    all_token_ids.append(str(tid))
+
     print(f"共获取 {len(markets)} 个市场")
 
-    # 可选：打印全部市场的 question 字段（在筛选前）
+    # 可选：打印全部市场的 question 字段（在筛选前的全部市场）
     if args.print_questions:
         print("所有市场的 question：")
         for idx, m in enumerate(markets, start=1):
             q = m.get("question")
             print(f"{idx}. {q}")
 
-    # 按要求筛选：accepting_orders=True 且 end_date_iso ∈ [now-24h, now+args.hours]
-    now_utc = datetime.now(timezone.utc)
-    forward_hours = max(0.0, args.hours)
-    start_cutoff = now_utc - timedelta(hours=24)
-    end_cutoff = now_utc + timedelta(hours=forward_hours)
-    filtered_markets: List[Dict[str, Any]] = []
-    for m in markets:
-        accepting = bool(m.get("accepting_orders"))
-        end_iso = pick(m, ["end_date_iso", "endDateIso", "endDate"], None)
-        end_dt = parse_iso_to_utc(end_iso)
-        if accepting and end_dt is not None and start_cutoff <= end_dt <= end_cutoff:
-            filtered_markets.append(m)
-
-    print(f"筛选后 {len(filtered_markets)} 个市场（accepting_orders=True 且 end_date ∈ [now-24h, now+{args.hours}h]）")
-
-    # 构造所需字段的记录（仅对筛选结果）
-    records: List[Dict[str, Any]] = [build_market_record(m) for m in filtered_markets]
-    # 收集所有 token_id 以批量获取 orderbooks
-    all_token_ids: List[str] = []
-    for r in records:
-        for t in r.get("tokens") or []:
-            tid = t.get("token_id")
-            if tid:
-                all_token_ids.append(str(tid))
+    print(f"筛选后 {len(records)} 个市场（accepting_orders=True 且 end_date ∈ [now-24h, now+{args.hours}h]）")
 
-    books_map = fetch_order_books_bulk(all_token_ids, batch_size=args.batch_size, debug=args.debug_books, client=client)
+    session = build_books_session()
+    try:
+        books_map = fetch_order_books_bulk(all_token_ids, batch_size=args.batch_size, debug=args.debug_books, client=client, session=session)
+    finally:
+        session.close()
     if args.debug_books:
         print(f"books_map 收到 {len(books_map)} 个 token 的订单簿摘要")
         # 打印前 3 个样本
@@ -318,8 +429,8 @@ def main():
         print_record(r)
 
     print(f"保存到 {args.out}")
-    with open(args.out, "w", encoding="utf-8") as f:
-        json.dump(records, f, ensure_ascii=False, indent=2)
+    with open(args.out, "wb") as f:
+        f.write(dumps(records, indent=True))
 
 
 if __name__ == "__main__":
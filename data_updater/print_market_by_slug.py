@@ -1,13 +1,20 @@
 # 按照某个市场的slug查询市场详情
 
 import argparse
-import json
 import os
 import re
 from typing import Optional
 
 import requests
 
+# 兼容以文件路径直接运行：尝试从项目根导入 data_updater 包
+try:
+    from data_updater.http_utils import dumps, loads
+except ModuleNotFoundError:
+    import sys
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from data_updater.http_utils import dumps, loads
+
 GAMMA_BASE = "https://gamma-api.polymarket.com"
 MARKET_BY_SLUG_URL_TMPL = GAMMA_BASE + "/markets/slug/{slug}"
 
@@ -44,14 +51,14 @@ def main():
         print(f"HTTP {resp.status_code} 错误：{resp.text}")
         return
 
-    data = resp.json()
-    text = json.dumps(data, ensure_ascii=False, indent=2)
-    print(text)
+    # bytes 进、bytes 出；仅打印时解码一次，保存时直接写入 bytes
+    data = dumps(loads(resp.content), indent=True)
+    print(data.decode("utf-8"))
 
     if args.out:
         try:
-            with open(args.out, "w", encoding="utf-8") as f:
-                f.write(text)
+            with open(args.out, "wb") as f:
+                f.write(data)
             print(f"已保存到 {args.out}")
         except Exception as e:
             print(f"保存到 {args.out} 失败：{e}")
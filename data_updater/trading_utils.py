@@ -9,8 +9,8 @@ from eth_account import Account
 from poly_data.utils import (
     build_tx_params,
     estimate_and_attach_gas,
-    send_signed_transaction_with_receipt,
     get_pending_nonce,
+    get_raw_tx_bytes,
 )
 
 import json
@@ -18,13 +18,59 @@ import json
 from dotenv import load_dotenv
 load_dotenv()
 
-import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 import os
 
 MAX_INT = 2**256 - 1
 
+# Multicall3 (same address on every chain) - lets us batch view calls into one eth_call
+MULTICALL3_ADDRESS = "0xcA11bde05977b3631167028862bE2a173976CA11"
+MULTICALL3_ABI = """[
+    {"inputs": [
+        {"components": [
+            {"internalType": "address", "name": "target", "type": "address" },
+            {"internalType": "bool", "name": "allowFailure", "type": "bool" },
+            {"internalType": "bytes", "name": "callData", "type": "bytes" }
+        ], "internalType": "struct Multicall3.Call3[]", "name": "calls", "type": "tuple[]" }
+    ], "name": "aggregate3", "outputs": [
+        {"components": [
+            {"internalType": "bool", "name": "success", "type": "bool" },
+            {"internalType": "bytes", "name": "returnData", "type": "bytes" }
+        ], "internalType": "struct Multicall3.Result[]", "name": "returnData", "type": "tuple[]" }
+    ], "stateMutability": "payable", "type": "function"}
+]"""
+
+# Process-wide client: creating one derives API creds (a signed network call)
+_clob_client = None
+_clob_client_lock = threading.Lock()
+
 def get_clob_client():
+    """
+    Return a shared, authenticated ClobClient, creating it on first use.
+
+    Only a successfully created client is cached; on failure None is returned
+    and the next call tries again.
+    """
+    global _clob_client
+    if _clob_client is not None:
+        return _clob_client
+
+    with _clob_client_lock:
+        if _clob_client is None:
+            _clob_client = _create_clob_client()
+        return _clob_client
+
+
+def reset_clob_client():
+    """Drop the cached client so the next get_clob_client() builds a fresh one (e.g. after a failed cycle)."""
+    global _clob_client
+    with _clob_client_lock:
+        _clob_client = None
+
+
+def _create_clob_client():
     host = "https://clob.polymarket.com"
     key = os.getenv("PK")
     chain_id = POLYGON
@@ -46,6 +92,57 @@ def get_clob_client():
         return None
 
 
+def _decode_or_call(web3, result, abi_type, fallback_call, default, label):
+    """Decode one aggregate3 result, falling back to a direct .call() if it failed."""
+    success, data = result
+    if success:
+        try:
+            return web3.codec.decode([abi_type], data)[0]
+        except Exception:
+            pass
+    try:
+        return fallback_call()
+    except Exception as ex:
+        print(f"{label}: {ex}")
+        return default
+
+
+def read_approval_state(web3, usdc_contract, ctf_contract, owner, spenders):
+    """
+    Read USDC allowance and CTF isApprovedForAll for every spender in a single
+    Multicall3 eth_call instead of 2 round-trips per spender.
+
+    Returns {spender: (allowance, is_approved)}. Any entry the batch could not
+    answer is read individually.
+    """
+    calls = []
+    for spender in spenders:
+        calls.append((usdc_contract.address, True, Web3.to_bytes(hexstr=usdc_contract.encodeABI(fn_name="allowance", args=[owner, spender]))))
+        calls.append((ctf_contract.address, True, Web3.to_bytes(hexstr=ctf_contract.encodeABI(fn_name="isApprovedForAll", args=[owner, spender]))))
+
+    try:
+        multicall = web3.eth.contract(address=MULTICALL3_ADDRESS, abi=MULTICALL3_ABI)
+        results = multicall.functions.aggregate3(calls).call()
+    except Exception as ex:
+        print(f"Multicall approval read failed, falling back to individual calls: {ex}")
+        results = [(False, b"")] * len(calls)
+
+    state = {}
+    for i, spender in enumerate(spenders):
+        allowance = _decode_or_call(
+            web3, results[2 * i], "uint256",
+            usdc_contract.functions.allowance(owner, spender).call,
+            0, f"Error reading USDC allowance for {spender}",
+        )
+        approved = _decode_or_call(
+            web3, results[2 * i + 1], "bool",
+            ctf_contract.functions.isApprovedForAll(owner, spender).call,
+            False, f"Error reading CTF isApprovedForAll for {spender}",
+        )
+        state[spender] = (allowance, approved)
+    return state
+
+
 def approveContracts():
     web3 = Web3(Web3.HTTPProvider("https://polygon-rpc.com"))
     web3.middleware_onion.inject(geth_poa_middleware, layer=0)
@@ -72,48 +169,66 @@ def approveContracts():
     ctf_contract = web3.eth.contract(address=ctf_address, abi=erc1155_abi)
     
 
-    for address in ['0x4bFb41d5B3570DeFd03C39a9A4D8dE6Bd8B8982E', '0xC5d563A36AE78145C45a50134d48A1215220f80a', '0xd91E80cF2E7be2e162c6513ceD06f1dD0dA35296']:
-        # USDC allowance check: only approve if not already MAX_INT
-        try:
-            current_allowance = usdc_contract.functions.allowance(wallet.address, address).call()
-        except Exception as ex:
-            print(f"Error reading USDC allowance for {address}: {ex}")
-            current_allowance = 0
+    spenders = ['0x4bFb41d5B3570DeFd03C39a9A4D8dE6Bd8B8982E', '0xC5d563A36AE78145C45a50134d48A1215220f80a', '0xd91E80cF2E7be2e162c6513ceD06f1dD0dA35296']
+    # Read every allowance / approval up front in one batched call
+    approval_state = read_approval_state(web3, usdc_contract, ctf_contract, wallet.address, spenders)
 
+    # Work out which approvals are missing, then pre-assign consecutive nonces so every
+    # tx can be signed up front and broadcast back to back instead of waiting a block for each
+    pending = []
+    for address in spenders:
+        current_allowance, already_approved = approval_state[address]
+
+        # USDC allowance check: only approve if not already MAX_INT
         if current_allowance < MAX_INT:
-            usdc_nonce = get_pending_nonce(web3, wallet.address)
-            tx_params = build_tx_params(web3, wallet.address, chain_id=137, nonce=usdc_nonce, eip1559=True, priority_fee_gwei=30)
-            raw_usdc_txn = usdc_contract.functions.approve(address, MAX_INT).build_transaction(tx_params)
-            raw_usdc_txn = estimate_and_attach_gas(web3, raw_usdc_txn)
-            signed_usdc_txn = Account.sign_transaction(raw_usdc_txn, os.getenv("PK"))
-            usdc_tx_receipt = send_signed_transaction_with_receipt(web3, signed_usdc_txn, timeout=600)
-            print(f'USDC Transaction for {address} returned {usdc_tx_receipt}')
-            time.sleep(1)
+            pending.append(('USDC', address, usdc_contract.functions.approve(address, MAX_INT)))
         else:
             print(f'USDC allowance already MAX_INT for {address}, skipping approve')
 
         # ERC1155 approval check: only set if not already approved
-        try:
-            already_approved = ctf_contract.functions.isApprovedForAll(wallet.address, address).call()
-        except Exception as ex:
-            print(f"Error reading CTF isApprovedForAll for {address}: {ex}")
-            already_approved = False
-
         if not already_approved:
-            ctf_nonce = get_pending_nonce(web3, wallet.address)
-            tx_params = build_tx_params(web3, wallet.address, chain_id=137, nonce=ctf_nonce, eip1559=True, priority_fee_gwei=30)
-            raw_ctf_approval_txn = ctf_contract.functions.setApprovalForAll(address, True).build_transaction(tx_params)
-            raw_ctf_approval_txn = estimate_and_attach_gas(web3, raw_ctf_approval_txn)
-            signed_ctf_approval_tx = Account.sign_transaction(raw_ctf_approval_txn, os.getenv("PK"))
-            ctf_approval_tx_receipt = send_signed_transaction_with_receipt(web3, signed_ctf_approval_tx, timeout=600)
-            print(f'CTF Transaction for {address} returned {ctf_approval_tx_receipt}')
-            time.sleep(1)
+            pending.append(('CTF', address, ctf_contract.functions.setApprovalForAll(address, True)))
         else:
             print(f'CTF isApprovedForAll already true for {address}, skipping setApprovalForAll')
 
+    if not pending:
+        return
+
+    nonce = get_pending_nonce(web3, wallet.address)
+    signed_txs = []
+    for i, (label, address, contract_fn) in enumerate(pending):
+        tx_params = build_tx_params(web3, wallet.address, chain_id=137, nonce=nonce + i, eip1559=True, priority_fee_gwei=30)
+        raw_txn = estimate_and_attach_gas(web3, contract_fn.build_transaction(tx_params))
+        signed_txs.append((label, address, Account.sign_transaction(raw_txn, os.getenv("PK"))))
+
+    # Broadcast in nonce order and stop at the first rejection: a tx queued behind a
+    # rejected nonce could never be mined. Only the receipt waits run concurrently.
+    sent, rejected = [], None
+    for label, address, signed in signed_txs:
+        try:
+            tx_hash = web3.eth.send_raw_transaction(get_raw_tx_bytes(signed))
+        except Exception as ex:
+            if "already known" not in str(ex):
+                print(f'{label} Transaction for {address} was rejected: {ex}')
+                print(f'Skipping {len(signed_txs) - len(sent) - 1} later approval transaction(s)')
+                rejected = ex
+                break
+            tx_hash = signed.hash
+        sent.append((label, address, tx_hash))
+
+    if sent:
+        with ThreadPoolExecutor(max_workers=min(6, len(sent))) as executor:
+            futures = [
+                (label, address, executor.submit(web3.eth.wait_for_transaction_receipt, tx_hash, timeout=600))
+                for label, address, tx_hash in sent
+            ]
+            for label, address, future in futures:
+                print(f'{label} Transaction for {address} returned {future.result()}')
+
+    if rejected is not None:
+        raise rejected
+
 
-    
-    
 def market_action( marketId, action, price, size ):
     order_args = OrderArgs(
         price=price,
@@ -121,10 +236,11 @@ def market_action( marketId, action, price, size ):
         side=action,
         token_id=marketId,
     )
-    signed_order = get_clob_client().create_order(order_args)
+    client = get_clob_client()
+    signed_order = client.create_order(order_args)
     
     try:
-        resp = get_clob_client().post_order(signed_order)
+        resp = client.post_order(signed_order)
         print(resp)
     except Exception as ex:
         print(ex)
@@ -4,11 +4,17 @@ import asyncio                 # Asynchronous I/O
 import traceback               # Exception handling
 import threading               # Thread management
 
+try:
+    import uvloop              # libuv-based event loop for the websocket tasks (not on Windows)
+except ImportError:
+    uvloop = None
+
 from poly_data.polymarket_client import PolymarketClient
 from poly_data.data_utils import update_markets, update_positions, update_orders
-from poly_data.websocket_handlers import connect_market_websocket, connect_user_websocket
+from poly_data.websocket_handlers import connect_market_websocket, connect_user_websocket, close_session
 import poly_data.global_state as global_state
 from poly_data.data_processing import remove_from_performing
+from poly_data.utils import setup_logging
 from dotenv import load_dotenv
 import warnings
 warnings.filterwarnings("ignore", message="pkg_resources is deprecated as an API.*")
@@ -82,6 +88,9 @@ async def main():
     """
     Main application entry point. Initializes client, data, and manages websocket connections.
     """
+    # Queue-backed logging so websocket error logs are formatted off the event loop
+    setup_logging()
+
     # Initialize client
     global_state.client = PolymarketClient()
     
@@ -102,7 +111,13 @@ async def main():
     user_task = asyncio.create_task(connect_user_websocket())
 
     # Keep main alive while tasks run; do not cross-cancel
-    await asyncio.gather(market_task, user_task, return_exceptions=True)
+    try:
+        await asyncio.gather(market_task, user_task, return_exceptions=True)
+    finally:
+        # Release the websocket connection pool shared by both tasks
+        await close_session()
 
 if __name__ == "__main__":
+    if uvloop is not None:
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
     asyncio.run(main())
\ No newline at end of file
@@ -1,4 +1,5 @@
 import json
+import logging
 from sortedcontainers import SortedDict
 import poly_data.global_state as global_state
 import poly_data.CONSTANTS as CONSTANTS
@@ -7,6 +8,9 @@ from trading import perform_trade
 import time 
 import asyncio
 from poly_data.data_utils import set_position, set_order, update_positions
+from poly_data.utils import log_exception
+
+logger = logging.getLogger(__name__)
 
 def process_book_data(asset, json_data):
     global_state.all_data[asset] = {
@@ -29,30 +33,55 @@ def process_price_change(asset, side, price_level, new_size):
     else:
         book[price_level] = new_size
 
-def process_data(json_datas, trade=True):
-
-    for json_data in json_datas:
-        event_type = json_data['event_type']
-        asset = json_data['market']
+def iter_events(payload):
+    """
+    Yield event dicts from a websocket payload: a single event, a list of events,
+    or a batch (list) of such frames. Anything that is not an event dict is skipped.
+    """
+    if type(payload) is dict:
+        yield payload
+        return
+    if type(payload) is not list:
+        # A JSON scalar (e.g. a bare string or number) carries no events
+        return
+    for item in payload:
+        if type(item) is dict:
+            yield item
+        elif type(item) is list:
+            for event in item:
+                if type(event) is dict:
+                    yield event
 
-        if event_type == 'book':
-            process_book_data(asset, json_data)
+def process_data(json_datas, trade=True):
+    """Apply market events; an event that fails is logged and the rest still apply."""
+    for json_data in iter_events(json_datas):
+        try:
+            process_market_event(json_data, trade)
+        except Exception:
+            log_exception(logger, "Failed to process market message")
+
+def process_market_event(json_data, trade=True):
+    event_type = json_data['event_type']
+    asset = json_data['market']
+
+    if event_type == 'book':
+        process_book_data(asset, json_data)
+
+        if trade:
+            asyncio.create_task(perform_trade(asset))
+            
+    elif event_type == 'price_change':
+        for data in json_data['changes']:
+            side = 'bids' if data['side'] == 'BUY' else 'asks'
+            price_level = float(data['price'])
+            new_size = float(data['size'])
+            process_price_change(asset, side, price_level, new_size)
 
             if trade:
                 asyncio.create_task(perform_trade(asset))
-                
-        elif event_type == 'price_change':
-            for data in json_data['changes']:
-                side = 'bids' if data['side'] == 'BUY' else 'asks'
-                price_level = float(data['price'])
-                new_size = float(data['size'])
-                process_price_change(asset, side, price_level, new_size)
-
-                if trade:
-                    asyncio.create_task(perform_trade(asset))
-        
+    
 
-        # pretty_print(f'Received book update for {asset}:', global_state.all_data[asset])
+    # pretty_print(f'Received book update for {asset}:', global_state.all_data[asset])
 
 def add_to_performing(col, id):
     if col not in global_state.performing:
@@ -73,77 +102,84 @@ def remove_from_performing(col, id):
         global_state.performing_timestamps[col].pop(id, None)
 
 def process_user_data(rows):
+    """Apply user order/trade events; an event that fails is logged and the rest still apply."""
+    market = None
+    for row in iter_events(rows):
+        market = row.get('market')
+        try:
+            process_user_event(row)
+        except Exception:
+            log_exception(logger, "Failed to process user message")
+    else:
+        print(f"User date received for {market} but its not in")
 
-    for row in rows:
-        market = row['market']
+def process_user_event(row):
+    market = row['market']
 
-        side = row['side'].lower()
-        token = row['asset_id']
-            
-        if token in global_state.REVERSE_TOKENS:     
-            col = token + "_" + side
-
-            if row['event_type'] == 'trade':
-                size = 0
-                price = 0
-                maker_outcome = ""
-                taker_outcome = row['outcome']
-
-                is_user_maker = False
-                for maker_order in row['maker_orders']:
-                    if maker_order['maker_address'].lower() == global_state.client.browser_wallet.lower():
-                        print("User is maker")
-                        size = float(maker_order['matched_amount'])
-                        price = float(maker_order['price'])
-                        
-                        is_user_maker = True
-                        maker_outcome = maker_order['outcome'] #this is curious
-
-                        if maker_outcome == taker_outcome:
-                            side = 'buy' if side == 'sell' else 'sell' #need to reverse as we reverse token too
-                        else:
-                            token = global_state.REVERSE_TOKENS[token]
-                
-                if not is_user_maker:
-                    size = float(row['size'])
-                    price = float(row['price'])
-                    print("User is taker")
-
-                print("TRADE EVENT FOR: ", row['market'], "ID: ", row['id'], "STATUS: ", row['status'], " SIDE: ", row['side'], "  MAKER OUTCOME: ", maker_outcome, " TAKER OUTCOME: ", taker_outcome, " PROCESSED SIDE: ", side, " SIZE: ", size) 
-
-
-                if row['status'] == 'CONFIRMED' or row['status'] == 'FAILED' :
-                    if row['status'] == 'FAILED':
-                        print(f"Trade failed for {token}, decreasing")
-                        asyncio.create_task(asyncio.sleep(2))
-                        update_positions()
+    side = row['side'].lower()
+    token = row['asset_id']
+        
+    if token in global_state.REVERSE_TOKENS:     
+        col = token + "_" + side
+
+        if row['event_type'] == 'trade':
+            size = 0
+            price = 0
+            maker_outcome = ""
+            taker_outcome = row['outcome']
+
+            is_user_maker = False
+            for maker_order in row['maker_orders']:
+                if maker_order['maker_address'].lower() == global_state.client.browser_wallet.lower():
+                    print("User is maker")
+                    size = float(maker_order['matched_amount'])
+                    price = float(maker_order['price'])
+                    
+                    is_user_maker = True
+                    maker_outcome = maker_order['outcome'] #this is curious
+
+                    if maker_outcome == taker_outcome:
+                        side = 'buy' if side == 'sell' else 'sell' #need to reverse as we reverse token too
                     else:
-                        remove_from_performing(col, row['id'])
-                        print("Confirmed. Performing is ", len(global_state.performing[col]))
-                        print("Last trade update is ", global_state.last_trade_update)
-                        print("Performing is ", global_state.performing)
-                        print("Performing timestamps is ", global_state.performing_timestamps)
-                        
-                        asyncio.create_task(perform_trade(market))
-
-                elif row['status'] == 'MATCHED':
-                    add_to_performing(col, row['id'])
-
-                    print("Matched. Performing is ", len(global_state.performing[col]))
-                    set_position(token, side, size, price)
-                    print("Position after matching is ", global_state.positions[str(token)])
+                        token = global_state.REVERSE_TOKENS[token]
+            
+            if not is_user_maker:
+                size = float(row['size'])
+                price = float(row['price'])
+                print("User is taker")
+
+            print("TRADE EVENT FOR: ", row['market'], "ID: ", row['id'], "STATUS: ", row['status'], " SIDE: ", row['side'], "  MAKER OUTCOME: ", maker_outcome, " TAKER OUTCOME: ", taker_outcome, " PROCESSED SIDE: ", side, " SIZE: ", size) 
+
+
+            if row['status'] == 'CONFIRMED' or row['status'] == 'FAILED' :
+                if row['status'] == 'FAILED':
+                    print(f"Trade failed for {token}, decreasing")
+                    asyncio.create_task(asyncio.sleep(2))
+                    update_positions()
+                else:
+                    remove_from_performing(col, row['id'])
+                    print("Confirmed. Performing is ", len(global_state.performing[col]))
                     print("Last trade update is ", global_state.last_trade_update)
                     print("Performing is ", global_state.performing)
                     print("Performing timestamps is ", global_state.performing_timestamps)
+                    
                     asyncio.create_task(perform_trade(market))
-                elif row['status'] == 'MINED':
-                    remove_from_performing(col, row['id'])
 
-            elif row['event_type'] == 'order':
-                print("ORDER EVENT FOR: ", row['market'], " STATUS: ",  row['status'], " TYPE: ", row['type'], " SIDE: ", side, "  ORIGINAL SIZE: ", row['original_size'], " SIZE MATCHED: ", row['size_matched'])
-                
-                set_order(token, side, float(row['original_size']) - float(row['size_matched']), row['price'])
+            elif row['status'] == 'MATCHED':
+                add_to_performing(col, row['id'])
+
+                print("Matched. Performing is ", len(global_state.performing[col]))
+                set_position(token, side, size, price)
+                print("Position after matching is ", global_state.positions[str(token)])
+                print("Last trade update is ", global_state.last_trade_update)
+                print("Performing is ", global_state.performing)
+                print("Performing timestamps is ", global_state.performing_timestamps)
                 asyncio.create_task(perform_trade(market))
+            elif row['status'] == 'MINED':
+                remove_from_performing(col, row['id'])
 
-    else:
-        print(f"User date received for {market} but its not in")
\ No newline at end of file
+        elif row['event_type'] == 'order':
+            print("ORDER EVENT FOR: ", row['market'], " STATUS: ",  row['status'], " TYPE: ", row['type'], " SIDE: ", side, "  ORIGINAL SIZE: ", row['original_size'], " SIZE MATCHED: ", row['size_matched'])
+            
+            set_order(token, side, float(row['original_size']) - float(row['size_matched']), row['price'])
+            asyncio.create_task(perform_trade(market))
\ No newline at end of file
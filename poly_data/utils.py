@@ -2,13 +2,74 @@ import json
 from poly_utils.google_utils import get_spreadsheet
 import pandas as pd 
 import os
+import sys
 import time
+import atexit
+import queue
+import threading
+import logging
+from logging.handlers import QueueHandler, QueueListener
 from web3 import Web3
 from web3.exceptions import TransactionNotFound, TimeExhausted
 
 def pretty_print(txt, dic):
     print("\n", txt, json.dumps(dic, indent=4))
 
+
+class _DeferredQueueHandler(QueueHandler):
+    """QueueHandler that leaves formatting (including tracebacks) to the listener thread."""
+
+    def prepare(self, record):
+        return record
+
+
+_log_listener = None
+
+
+def setup_logging(level=logging.INFO):
+    """
+    Route logging through a queue: callers only enqueue the record, while message and
+    traceback formatting plus the stdout write happen on a background listener thread.
+    Safe to call more than once.
+    """
+    global _log_listener
+    if _log_listener is not None:
+        return
+
+    log_queue = queue.SimpleQueue()
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(logging.Formatter("%(message)s"))
+    _log_listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _log_listener.start()
+    atexit.register(_log_listener.stop)
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(_DeferredQueueHandler(log_queue))
+
+
+# At most ERROR_LOG_BURST tracebacks per message per ERROR_LOG_WINDOW seconds, so a
+# storm of malformed frames or events cannot starve the event loop on traceback formatting
+ERROR_LOG_BURST = 5
+ERROR_LOG_WINDOW = 1.0
+_error_log_state = {}
+
+
+def log_exception(logger, msg):
+    """logger.exception, rate limited per message; call from inside an except block."""
+    now = time.monotonic()
+    window_start, logged, suppressed = _error_log_state.get(msg, (now, 0, 0))
+    if now - window_start >= ERROR_LOG_WINDOW:
+        if suppressed:
+            logger.warning("%s: suppressed %d more in the last %.0fs", msg, suppressed, ERROR_LOG_WINDOW)
+        window_start, logged, suppressed = now, 0, 0
+    if logged < ERROR_LOG_BURST:
+        logger.exception(msg)
+        logged += 1
+    else:
+        suppressed += 1
+    _error_log_state[msg] = (window_start, logged, suppressed)
+
 def get_sheet_df(read_only=None):
     """
     Get sheet data with optional read-only mode
@@ -43,34 +104,54 @@ def get_sheet_df(read_only=None):
     result = df.merge(df2, on='question', how='inner')
 
     wk_p = spreadsheet.worksheet('Hyperparameters')
-    records = wk_p.get_all_records()
-    hyperparams, current_type = {}, None
-
-    for r in records:
-        # Update current_type only when we have a non-empty type value
-        # Handle both string and NaN values from pandas
-        type_value = r['type']
-        if type_value and str(type_value).strip() and str(type_value) != 'nan':
-            current_type = str(type_value).strip()
-        
-        # Skip rows where we don't have a current_type set
-        if current_type:
-            # Convert numeric values to appropriate types
-            value = r['value']
-            try:
-                # Try to convert to float if it's numeric
-                if isinstance(value, str) and value.replace('.', '').replace('-', '').isdigit():
-                    value = float(value)
-                elif isinstance(value, (int, float)):
-                    value = float(value)
-            except (ValueError, TypeError):
-                pass  # Keep as string if conversion fails
-            
-            hyperparams.setdefault(current_type, {})[r['param']] = value
+    hyperparams = parse_hyperparameters(wk_p.get_all_records())
 
     return result, hyperparams
 
 
+def parse_hyperparameters(records):
+    """
+    Build {type: {param: value}} from the Hyperparameters sheet rows.
+
+    The 'type' column is only filled on the first row of each block, so it is
+    forward-filled; rows before the first type are dropped. Values are converted
+    by _hyperparameter_value.
+    """
+    if not records:
+        return {}
+
+    # dtype=object keeps the sheet's own Python values instead of upcasting columns
+    hp_df = pd.DataFrame(records, dtype=object)
+
+    # Handle both string and NaN values from pandas
+    raw_types = hp_df['type']
+    types = raw_types.astype(str)
+    valid = raw_types.map(bool) & types.str.strip().ne('') & types.ne('nan')
+    hp_df['type'] = types.str.strip().where(valid).ffill()
+
+    hp_df['value'] = pd.Series([_hyperparameter_value(v) for v in hp_df['value']], index=hp_df.index, dtype=object)
+
+    return {
+        param_type: dict(zip(group['param'], group['value']))
+        for param_type, group in hp_df.dropna(subset=['type']).groupby('type', sort=False)
+    }
+
+
+def _hyperparameter_value(value):
+    """
+    Numbers, and strings made only of digits, '.' and '-', become float; anything
+    else (including '1e5' or ' 3 ') is kept as-is.
+    """
+    try:
+        if isinstance(value, str) and value.replace('.', '').replace('-', '').isdigit():
+            return float(value)
+        if isinstance(value, (int, float)):
+            return float(value)
+    except (ValueError, TypeError):
+        pass  # Keep as string if conversion fails
+    return value
+
+
 # ===== Transaction Utilities =====
 
 def get_raw_tx_bytes(signed_tx):
@@ -87,7 +168,33 @@ def get_pending_nonce(web3, address):
         return web3.eth.get_transaction_count(address)
 
 
-def build_eip1559_fees(web3, priority_fee_gwei=30, multiplier=2.0):
+# Fee quotes barely move within a Polygon block (~2s), so a burst of txs such as
+# approveContracts can share one eth_feeHistory round trip
+FEE_CACHE_TTL_SECONDS = 2.0
+_fee_cache = {}
+_fee_cache_lock = threading.Lock()
+
+
+def _fee_history_fees(web3, priority_fee_gwei, multiplier):
+    """
+    Base fee and median tip of the last 5 blocks from a single eth_feeHistory call.
+    Returns None when the node does not support it.
+    """
+    try:
+        history = web3.eth.fee_history(5, 'pending', [50])
+        base_fee = int(history['baseFeePerGas'][-1])
+        tips = sorted(int(r[0]) for r in (history.get('reward') or []) if r)
+    except Exception:
+        return None
+
+    priority = tips[len(tips) // 2] if tips else Web3.to_wei(priority_fee_gwei, 'gwei')
+    return {
+        "maxPriorityFeePerGas": int(priority),
+        "maxFeePerGas": int(multiplier * base_fee) + int(priority),
+    }
+
+
+def _legacy_eip1559_fees(web3, priority_fee_gwei, multiplier):
     base_fee = None
     try:
         block = web3.eth.get_block('pending')
@@ -119,6 +226,23 @@ def build_eip1559_fees(web3, priority_fee_gwei=30, multiplier=2.0):
     }
 
 
+def build_eip1559_fees(web3, priority_fee_gwei=30, multiplier=2.0):
+    key = (id(web3), priority_fee_gwei, multiplier)
+    now = time.monotonic()
+    with _fee_cache_lock:
+        cached = _fee_cache.get(key)
+        if cached is not None and cached[0] > now:
+            return dict(cached[1])
+
+    fees = _fee_history_fees(web3, priority_fee_gwei, multiplier)
+    if fees is None:
+        fees = _legacy_eip1559_fees(web3, priority_fee_gwei, multiplier)
+
+    with _fee_cache_lock:
+        _fee_cache[key] = (now + FEE_CACHE_TTL_SECONDS, fees)
+    return dict(fees)
+
+
 def build_tx_params(web3, from_addr, chain_id, nonce=None, eip1559=True, priority_fee_gwei=30):
     if nonce is None:
         nonce = get_pending_nonce(web3, from_addr)
@@ -1,150 +1,332 @@
 import asyncio                      # Asynchronous I/O
 import json                         # JSON handling
-import traceback                    # Exception handling
+import logging                      # Status/error logging (formatted off the event loop)
+import random                       # Reconnect backoff jitter
+import time                         # Connection uptime
 import os                           # Environment variables
 
 import aiohttp                      # HTTP/WebSocket client with proxy support
 from aiohttp import ClientTimeout, WSMsgType
 
+try:
+    import orjson                   # Fast JSON parsing for the hot recv loop
+except ImportError:  # fall back to the stdlib json when orjson is unavailable
+    orjson = None
+
 from poly_data.data_processing import process_data, process_user_data
+from poly_data.utils import log_exception
 import poly_data.global_state as global_state
 
+logger = logging.getLogger(__name__)
+
+
+# Parses a websocket frame payload (str or bytes), preferring orjson. Frames are parsed
+# inline on the event loop on purpose: orjson (like the stdlib json) holds the GIL for
+# the whole parse, so a thread pool would not let the loop run meanwhile, and even a
+# ~16 KB book snapshot parses in ~150us.
+_loads = orjson.loads if orjson is not None else json.loads
+
+
+def _dumps(obj):
+    """Serialize an outbound message to UTF-8 JSON bytes, preferring orjson."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj).encode("utf-8")
+
+
+async def _send_text(ws, frame):
+    """
+    Send pre-encoded UTF-8 JSON bytes as a TEXT frame. send_str only accepts str and
+    re-encodes it, so go through the frame writer directly when it is available.
+    The writer is private aiohttp API (WebSocketWriter.send(data, binary) as of the
+    pinned 3.9.x); if it is missing or its signature changes, fall back to send_str.
+    """
+    writer = getattr(ws, "_writer", None)
+    if writer is not None:
+        try:
+            await writer.send(frame, binary=False)
+            return
+        except (TypeError, AttributeError):
+            pass
+    await ws.send_str(frame.decode("utf-8"))
+
+
+# One pooled session shared by both websocket tasks; created lazily on the running loop
+_session = None
+
+
+async def get_session():
+    """Return the shared ClientSession, creating it on first use (or after close_session)."""
+    global _session
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(limit=100, limit_per_host=20, keepalive_timeout=75, ttl_dns_cache=300)
+        _session = aiohttp.ClientSession(connector=connector, timeout=ClientTimeout(total=None, connect=60))
+    return _session
+
+
+async def close_session():
+    """Close the shared ClientSession; call on shutdown from the event loop that created it."""
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
+
+# Upper bound on frames drained from the queue into a single process_data call, to
+# bound batch latency
+MAX_DRAIN_FRAMES = 256
+
+# Frames parsed but not yet applied. When full, the recv loop waits (backpressure)
+# rather than dropping: a lost price_change delta would silently corrupt the book
+EVENT_QUEUE_SIZE = 1024
+
+# Both connections offer permessage-deflate (compress=15, i.e. a 32 KiB window): the
+# verbose book JSON shrinks several-fold on the wire, aiohttp inflates frames before
+# they reach _pump, and it falls back to uncompressed if the server declines
+WS_COMPRESS = 15
+
+# Frame types that end the receive loop; anything else that is not TEXT/BINARY (ping/pong) is skipped
+_END_TYPES = frozenset((WSMsgType.CLOSE, WSMsgType.CLOSING, WSMsgType.CLOSED, WSMsgType.ERROR))
+
+# Reconnect backoff: a clean server close after a stable session reconnects immediately;
+# errors (and sessions closed within STABLE_CONNECTION_SECONDS) wait RECONNECT_DELAY,
+# doubling on consecutive failures up to MAX_RECONNECT_DELAY
+RECONNECT_DELAY = 5
+MAX_RECONNECT_DELAY = 60
+STABLE_CONNECTION_SECONDS = 10
+# Consecutive failed attempts (~15 minutes at MAX_RECONNECT_DELAY) before a CRITICAL log
+ESCALATE_AFTER_FAILURES = 20
+
+
+class RestartPolicy:
+    """
+    Jittered exponential backoff for one supervised websocket connection.
+
+    Each consecutive failure waits base_delay * 2**n (capped at max_delay), +/- jitter
+    so the two sockets do not retry in lockstep. _pump calls reset() once a session has
+    stayed up STABLE_CONNECTION_SECONDS, so a server that accepts and then drops keeps
+    escalating. Once escalate_after failures pile up the policy reports escalated;
+    the supervisor then logs CRITICAL but keeps retrying, since the bot cannot quote
+    without its feeds.
+    """
+
+    def __init__(self, base_delay=RECONNECT_DELAY, max_delay=MAX_RECONNECT_DELAY, jitter=0.2,
+                 escalate_after=ESCALATE_AFTER_FAILURES):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.escalate_after = escalate_after
+        self.failures = 0
+
+    def reset(self):
+        self.failures = 0
+
+    def next_delay(self):
+        """Record a failure and return how long to wait before the next attempt."""
+        self.failures += 1
+        delay = min(self.base_delay * 2 ** min(self.failures - 1, 16), self.max_delay)
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    @property
+    def escalated(self):
+        return self.failures >= self.escalate_after
+
+
+async def _supervised_ws(name, connect_once, policy=None):
+    """
+    Run connect_once(policy) forever, applying policy between attempts.
+
+    connect_once opens one connection and hands policy to _pump (which resets it once the
+    session is stable), and returns True when the server closed a stable session cleanly
+    (reconnect immediately) or False to back off. Exceptions are logged and count as
+    failures; cancellation propagates.
+    """
+    if policy is None:
+        policy = RestartPolicy()
+
+    while True:
+        try:
+            if await connect_once(policy):
+                continue
+        except asyncio.CancelledError:
+            logger.info("%s websocket task cancelled", name)
+            raise
+        except (aiohttp.ClientConnectorError, aiohttp.ClientProxyConnectionError, TimeoutError, asyncio.TimeoutError, OSError) as e:
+            logger.exception("%s websocket connection error: %s", name, e)
+        except Exception as e:
+            logger.exception("%s websocket handshake failed: %s", name, e)
+
+        delay = policy.next_delay()
+        if policy.escalated:
+            logger.critical("%s websocket has failed %d times in a row; retrying every ~%ds",
+                            name, policy.failures, policy.max_delay)
+        logger.info("Reconnecting %s websocket in %.1fs", name.lower(), delay)
+        await asyncio.sleep(delay)
+
+
+async def _consume(queue, process, name):
+    """
+    Apply queued payloads in arrival order. Waits for one, then takes everything
+    already queued (up to MAX_DRAIN_FRAMES) and passes it to process in one call;
+    process_data/process_user_data isolate failures per event, so one bad event is
+    logged without dropping the events batched behind it.
+
+    Runs on the event loop because process_data schedules trades with
+    asyncio.create_task; it only decouples draining the socket from applying updates.
+    """
+    _get = queue.get
+    _get_nowait = queue.get_nowait
+    _empty = queue.empty
+    _max_frames = MAX_DRAIN_FRAMES
+    while True:
+        batch = [await _get()]
+        while len(batch) < _max_frames and not _empty():
+            batch.append(_get_nowait())
+        try:
+            process(batch)
+        except Exception:
+            # Per-event errors are handled inside process; this only keeps the consumer alive
+            log_exception(logger, f"Failed to process {name.lower()} message batch")
+
+
+async def _pump(ws, queue, name, policy):
+    """
+    Parse frames from a subscribed ws onto queue until the connection ends, resetting
+    policy once the session has stayed up STABLE_CONNECTION_SECONDS.
+
+    Each TEXT/BINARY frame is queued as one payload (an event or a list of events;
+    process_data/process_user_data accept both). Returns True if the server closed a
+    stable session cleanly (reconnect right away).
+    """
+    connected_at = time.monotonic()
+    # A timer rather than a check per frame: it also fires on a quiet connection and
+    # costs the recv loop nothing
+    stable_timer = asyncio.get_running_loop().call_later(STABLE_CONNECTION_SECONDS, policy.reset)
+    # Hot loop: bind globals and bound methods to locals once per connection
+    # (LOAD_FAST instead of dict probes on every frame)
+    _TEXT = WSMsgType.TEXT
+    _BINARY = WSMsgType.BINARY
+    _end_types = _END_TYPES
+    _parse = _loads
+    _decode_error = json.JSONDecodeError
+    _recv = ws.receive
+    _put = queue.put
+    try:
+        while True:
+            # WSMessage is a namedtuple: unpacking beats two attribute lookups, and aiohttp
+            # hands back the WSMsgType members themselves, so identity checks are safe
+            msg_type, msg_data, _ = await _recv()
+            # TEXT frames arrive as str (aiohttp decodes them); BINARY frames stay bytes and
+            # go to the parser as-is, with no UTF-8 decode or copy
+            if msg_type is _TEXT or msg_type is _BINARY:
+                try:
+                    payload = _parse(msg_data)
+                except _decode_error:
+                    log_exception(logger, f"Failed to decode {name.lower()} message JSON")
+                    continue
+                await _put(payload)
+            elif msg_type in _end_types:
+                # Unhappy path: one membership test covers close and error frames
+                if msg_type is WSMsgType.ERROR:
+                    logger.warning("%s websocket error message", name)
+                else:
+                    logger.warning("%s websocket closed by server", name)
+                end = msg_type
+                break
+    finally:
+        stable_timer.cancel()
+    return end is not WSMsgType.ERROR and time.monotonic() - connected_at >= STABLE_CONNECTION_SECONDS
+
+
 async def connect_market_websocket(chunk):
     """
     Connect to Polymarket's market WebSocket API and process market updates.
 
-    Manages its own reconnect loop and captures handshake-time exceptions to
+    Reconnects under _supervised_ws, which captures handshake-time exceptions to
     prevent cross-cancellation with sibling tasks.
     """
     uri = "wss://ws-subscriptions-clob.polymarket.com/ws/market"
     proxy = os.getenv("WS_PROXY")  # e.g., http://127.0.0.1:7890
-    timeout = ClientTimeout(total=None, connect=60)
+    # chunk is the live global_state.all_tokens list, which only ever grows, so the
+    # subscription frame is re-serialized only when its length has changed
+    message = {"assets_ids": chunk}
+    sub_frame, sub_len = None, -1
 
-    async with aiohttp.ClientSession(timeout=timeout) as session:
-        while True:
-            try:
-                print(f"Attempting market websocket connect: uri={uri}, tokens={len(chunk)}, proxy={bool(proxy)}")
-                ws = await session.ws_connect(
-                    uri,
-                    proxy=proxy,
-                    heartbeat=5,
-                    timeout=60,
-                )
-
-                message = {"assets_ids": chunk}
-                await ws.send_str(json.dumps(message))
-
-                print("\n")
-                print(f"Sent market subscription message: {message}")
-
-                while True:
-                    msg = await ws.receive()
-                    if msg.type == WSMsgType.TEXT:
-                        try:
-                            payload = json.loads(msg.data)
-                            if isinstance(payload, list):
-                                events = payload
-                            elif isinstance(payload, dict):
-                                events = [payload]
-                            else:
-                                print(f"Ignoring non-JSON-event market message: {payload!r}")
-                                continue
-
-                            process_data(events)
-                        except json.JSONDecodeError:
-                            print("Failed to decode market message JSON")
-                            print(traceback.format_exc())
-                        except Exception:
-                            print("Failed to process market message")
-                            print(traceback.format_exc())
-                    elif msg.type in (WSMsgType.CLOSE, WSMsgType.CLOSING, WSMsgType.CLOSED):
-                        print("Market websocket closed by server")
-                        break
-                    elif msg.type == WSMsgType.ERROR:
-                        print("Market websocket error message")
-                        break
-            except asyncio.CancelledError:
-                print("Market websocket task cancelled")
-                raise
-            except (aiohttp.ClientConnectorError, aiohttp.ClientProxyConnectionError, TimeoutError, asyncio.TimeoutError, OSError) as e:
-                print(f"Market websocket connection error: {e}")
-                print(traceback.format_exc())
-            except Exception as e:
-                print(f"Market websocket handshake failed: {e}")
-                print(traceback.format_exc())
-            finally:
-                await asyncio.sleep(5)
+    queue = asyncio.Queue(maxsize=EVENT_QUEUE_SIZE)
+    consumer = asyncio.create_task(_consume(queue, process_data, "Market"))
+
+    async def connect_once(policy):
+        nonlocal sub_frame, sub_len
+        # Fetched per attempt so a reconnect after close_session() gets a fresh pool
+        session = await get_session()
+        logger.info("Attempting market websocket connect: uri=%s, tokens=%d, proxy=%s", uri, len(chunk), bool(proxy))
+        ws = await session.ws_connect(
+            uri,
+            proxy=proxy,
+            heartbeat=5,
+            timeout=60,
+            compress=WS_COMPRESS,
+        )
+
+        if len(chunk) != sub_len:
+            sub_len = len(chunk)
+            sub_frame = _dumps(message)
+        await _send_text(ws, sub_frame)
+
+        logger.info("Sent market subscription message for %d tokens", sub_len)
+        return await _pump(ws, queue, "Market", policy)
+
+    try:
+        await _supervised_ws("Market", connect_once)
+    finally:
+        consumer.cancel()
 
 async def connect_user_websocket():
     """
     Connect to Polymarket's user WebSocket API and process order/trade updates.
 
-    Manages its own reconnect loop and captures handshake-time exceptions,
-    sending auth before entering the recv loop.
+    Reconnects under _supervised_ws, which captures handshake-time exceptions;
+    auth is sent before entering the recv loop.
     """
     uri = "wss://ws-subscriptions-clob.polymarket.com/ws/user"
     proxy = os.getenv("WS_PROXY")
-    timeout = ClientTimeout(total=None, connect=60)
+    # Credentials are fixed for the process lifetime, so the auth frame is serialized once.
+    # That happens on the first attempt rather than at task start: if reading the creds
+    # fails, _supervised_ws logs it and retries instead of the task dying silently
+    auth_frame = None
 
-    async with aiohttp.ClientSession(timeout=timeout) as session:
-        while True:
-            try:
-                print(f"Attempting user websocket connect: uri={uri}, proxy={bool(proxy)}")
-                ws = await session.ws_connect(
-                    uri,
-                    proxy=proxy,
-                    heartbeat=5,
-                    timeout=60,
-                )
-
-                message = {
-                    "type": "user",
-                    "auth": {
-                        "apiKey": global_state.client.client.creds.api_key,
-                        "secret": global_state.client.client.creds.api_secret,
-                        "passphrase": global_state.client.client.creds.api_passphrase,
-                    },
-                }
-
-                await ws.send_str(json.dumps(message))
-
-                print("\n")
-                print("Sent user subscription message")
-
-                while True:
-                    msg = await ws.receive()
-                    if msg.type == WSMsgType.TEXT:
-                        try:
-                            payload = json.loads(msg.data)
-                            if isinstance(payload, list):
-                                rows = payload
-                            elif isinstance(payload, dict):
-                                rows = [payload]
-                            else:
-                                print(f"Ignoring non-JSON-event user message: {payload!r}")
-                                continue
-
-                            process_user_data(rows)
-                        except json.JSONDecodeError:
-                            print("Failed to decode user message JSON")
-                            print(traceback.format_exc())
-                        except Exception:
-                            print("Failed to process user message")
-                            print(traceback.format_exc())
-                    elif msg.type in (WSMsgType.CLOSE, WSMsgType.CLOSING, WSMsgType.CLOSED):
-                        print("User websocket closed by server")
-                        break
-                    elif msg.type == WSMsgType.ERROR:
-                        print("User websocket error message")
-                        break
-            except asyncio.CancelledError:
-                print("User websocket task cancelled")
-                raise
-            except (aiohttp.ClientConnectorError, aiohttp.ClientProxyConnectionError, TimeoutError, asyncio.TimeoutError, OSError) as e:
-                print(f"User websocket connection error: {e}")
-                print(traceback.format_exc())
-            except Exception as e:
-                print(f"User websocket handshake failed: {e}")
-                print(traceback.format_exc())
-            finally:
-                await asyncio.sleep(5)
\ No newline at end of file
+    queue = asyncio.Queue(maxsize=EVENT_QUEUE_SIZE)
+    consumer = asyncio.create_task(_consume(queue, process_user_data, "User"))
+
+    async def connect_once(policy):
+        nonlocal auth_frame
+        if auth_frame is None:
+            creds = global_state.client.client.creds
+            auth_frame = _dumps({
+                "type": "user",
+                "auth": {
+                    "apiKey": creds.api_key,
+                    "secret": creds.api_secret,
+                    "passphrase": creds.api_passphrase,
+                },
+            })
+
+        session = await get_session()
+        logger.info("Attempting user websocket connect: uri=%s, proxy=%s", uri, bool(proxy))
+        ws = await session.ws_connect(
+            uri,
+            proxy=proxy,
+            heartbeat=5,
+            timeout=60,
+            compress=WS_COMPRESS,
+        )
+
+        await _send_text(ws, auth_frame)
+
+        logger.info("Sent user subscription message")
+        return await _pump(ws, queue, "User", policy)
+
+    try:
+        await _supervised_ws("User", connect_once)
+    finally:
+        consumer.cancel()
\ No newline at end of file
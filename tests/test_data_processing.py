@@ -0,0 +1,16 @@
+from poly_data.data_processing import iter_events
+
+
+def test_iter_events_shapes():
+    a, b, c = {"n": 1}, {"n": 2}, {"n": 3}
+
+    assert list(iter_events(a)) == [a]
+    assert list(iter_events([a, b])) == [a, b]
+    # a batch of frames, each a single event or a list of events
+    assert list(iter_events([a, [b, "x"], 7, c])) == [a, b, c]
+
+
+def test_iter_events_skips_scalar_payloads():
+    for payload in ("PONG", 42, 1.5, None, True):
+        assert list(iter_events(payload)) == []
+    assert list(iter_events(["PONG", 42, None])) == []
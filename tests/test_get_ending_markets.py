@@ -0,0 +1,23 @@
+import io
+import json
+
+import pytest
+
+from data_updater.get_ending_markets import _write_json_list
+
+
+@pytest.mark.parametrize("items", [
+    [],
+    [{}],
+    [{"question": "Will it?\nMaybe", "tokens": [{"outcome": "Yes", "price": 0.5}], "tags": []}, 3, None],
+])
+@pytest.mark.parametrize("indent", [True, False])
+def test_write_json_list_matches_json_dumps(items, indent):
+    f = io.BytesIO()
+    _write_json_list(f, items, indent=indent)
+
+    if indent:
+        expected = json.dumps(items, ensure_ascii=False, indent=2)
+    else:
+        expected = json.dumps(items, ensure_ascii=False, separators=(",", ":"))
+    assert f.getvalue().decode("utf-8") == expected + "\n"
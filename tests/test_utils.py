@@ -0,0 +1,45 @@
+from poly_data.utils import parse_hyperparameters
+
+
+def test_parse_hyperparameters_values():
+    records = [
+        {"type": "", "param": "orphan", "value": 1},
+        {"type": "default", "param": "int_value", "value": 3},
+        {"type": "", "param": "float_value", "value": 0.5},
+        {"type": "", "param": "numeric_str", "value": "-2.5"},
+        {"type": "", "param": "exp_str", "value": "1e5"},
+        {"type": "", "param": "padded_str", "value": " 3 "},
+        {"type": "", "param": "bad_number", "value": "1.2.3"},
+        {"type": " aggressive ", "param": "sleep_period", "value": 6},
+        {"type": "", "param": "name", "value": "fast"},
+    ]
+
+    params = parse_hyperparameters(records)
+
+    assert list(params) == ["default", "aggressive"]
+    default = params["default"]
+    assert default == {
+        "int_value": 3.0,
+        "float_value": 0.5,
+        "numeric_str": -2.5,
+        "exp_str": "1e5",
+        "padded_str": " 3 ",
+        "bad_number": "1.2.3",
+    }
+    assert type(default["int_value"]) is float
+    assert params["aggressive"] == {"sleep_period": 6.0, "name": "fast"}
+    assert type(params["aggressive"]["sleep_period"]) is float
+
+
+def test_parse_hyperparameters_all_int_column():
+    params = parse_hyperparameters([
+        {"type": "default", "param": "a", "value": 1},
+        {"type": "", "param": "b", "value": 2},
+    ])
+
+    assert params == {"default": {"a": 1.0, "b": 2.0}}
+    assert all(type(v) is float for v in params["default"].values())
+
+
+def test_parse_hyperparameters_empty():
+    assert parse_hyperparameters([]) == {}
@@ -0,0 +1,225 @@
+import asyncio
+import json
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+import poly_data.global_state as global_state
+from poly_data.data_processing import process_data
+from poly_data import websocket_handlers as wsh
+
+
+def _book(asset, price):
+    return {"event_type": "book", "market": asset,
+            "bids": [{"price": price, "size": "10"}], "asks": []}
+
+
+def test_consume_keeps_events_after_a_bad_one():
+    calls = []
+
+    def process(batch):
+        calls.append(len(batch))
+        process_data(batch, trade=False)
+
+    async def run():
+        queue = asyncio.Queue()
+        frames = [
+            _book("a1", "0.40"),
+            # price_change without "changes": process_market_event raises KeyError
+            {"event_type": "price_change", "market": "a1"},
+            _book("a2", "0.55"),
+            # a bad event in the middle of a multi-event frame
+            [_book("a3", "0.60"), {"event_type": "book", "market": "a4"}, _book("a5", "0.70")],
+        ]
+        for frame in frames:
+            queue.put_nowait(frame)
+
+        consumer = asyncio.create_task(wsh._consume(queue, process, "Market"))
+        await asyncio.sleep(0)
+        consumer.cancel()
+
+    global_state.all_data = {}
+    asyncio.run(run())
+    # The queued frames arrive as one batch, in a single process call
+    assert calls == [4]
+    assert set(global_state.all_data) >= {"a1", "a2", "a3", "a5"}
+    assert list(global_state.all_data["a2"]["bids"]) == [0.55]
+    assert list(global_state.all_data["a5"]["bids"]) == [0.70]
+
+
+class _FakeWS:
+    """Yields the given (type, data) frames with a delay before each, then CLOSE."""
+
+    def __init__(self, frames, delay=0.0):
+        self._frames = list(frames)
+        self._delay = delay
+
+    async def receive(self):
+        await asyncio.sleep(self._delay)
+        if self._frames:
+            msg_type, data = self._frames.pop(0)
+            return msg_type, data, None
+        return wsh.WSMsgType.CLOSE, None, None
+
+
+def test_pump_keeps_backoff_when_server_drops_right_away():
+    policy = wsh.RestartPolicy()
+    policy.failures = 3
+
+    async def run():
+        return await wsh._pump(_FakeWS([]), asyncio.Queue(), "Market", policy)
+
+    assert asyncio.run(run()) is False
+    assert policy.failures == 3
+
+
+def test_pump_resets_backoff_after_stable_session(monkeypatch):
+    monkeypatch.setattr(wsh, "STABLE_CONNECTION_SECONDS", 0.05)
+    policy = wsh.RestartPolicy()
+    policy.failures = 3
+    frames = [(wsh.WSMsgType.TEXT, '{"event_type": "book"}')] * 3
+
+    async def run():
+        queue = asyncio.Queue()
+        stable = await wsh._pump(_FakeWS(frames, delay=0.03), queue, "Market", policy)
+        return stable, queue.qsize()
+
+    assert asyncio.run(run()) == (True, 3)
+    assert policy.failures == 0
+
+
+async def _serve(handler):
+    """Start a local aiohttp server with a websocket handler at /."""
+    app = web.Application()
+    app.router.add_get("/", handler)
+    server = TestServer(app)
+    await server.start_server()
+    return server
+
+
+def test_send_text_arrives_as_text_frame():
+    received = []
+
+    async def handler(request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        received.append(await ws.receive())
+        await ws.close()
+        return ws
+
+    async def run():
+        server = await _serve(handler)
+        try:
+            session = await wsh.get_session()
+            ws = await session.ws_connect(server.make_url("/"))
+            await wsh._send_text(ws, wsh._dumps({"assets_ids": ["1", "2"]}))
+            await ws.receive()
+        finally:
+            await wsh.close_session()
+            await server.close()
+
+    asyncio.run(run())
+    assert received[0].type is wsh.WSMsgType.TEXT
+    assert json.loads(received[0].data) == {"assets_ids": ["1", "2"]}
+
+
+def test_send_text_falls_back_when_writer_signature_changes():
+    sent = []
+
+    class _Writer:
+        async def send(self, data):  # no "binary" keyword
+            raise AssertionError("not reached")
+
+    class _WS:
+        _writer = _Writer()
+
+        async def send_str(self, data):
+            sent.append(data)
+
+    asyncio.run(wsh._send_text(_WS(), b'{"type":"user"}'))
+    assert sent == ['{"type":"user"}']
+
+
+def _loop_policies():
+    policies = [pytest.param(asyncio.DefaultEventLoopPolicy, id="asyncio")]
+    try:
+        import uvloop
+    except ImportError:
+        pass
+    else:
+        policies.append(pytest.param(uvloop.EventLoopPolicy, id="uvloop"))
+    return policies
+
+
+@pytest.mark.parametrize("policy_cls", _loop_policies())
+def test_pump_and_queue_deliver_every_frame_in_order(policy_cls):
+    n_frames = 2 * wsh.MAX_DRAIN_FRAMES + 90
+
+    async def handler(request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        for i in range(n_frames):
+            await ws.send_str(json.dumps({"i": i}))
+        await ws.close()
+        return ws
+
+    async def run():
+        server = await _serve(handler)
+        applied = []
+        queue = asyncio.Queue(maxsize=wsh.EVENT_QUEUE_SIZE)
+        consumer = asyncio.create_task(wsh._consume(queue, applied.extend, "Market"))
+        try:
+            session = await wsh.get_session()
+            ws = await session.ws_connect(server.make_url("/"))
+            stable = await wsh._pump(ws, queue, "Market", wsh.RestartPolicy())
+            await asyncio.sleep(0.05)
+            return stable, applied
+        finally:
+            consumer.cancel()
+            await wsh.close_session()
+            await server.close()
+
+    loop = policy_cls().new_event_loop()
+    try:
+        stable, applied = loop.run_until_complete(run())
+    finally:
+        loop.close()
+
+    # Closed right after connecting: not a stable session, so the supervisor backs off
+    assert stable is False
+    assert applied == [{"i": i} for i in range(n_frames)]
+
+
+def test_pump_frame_types():
+    async def handler(request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        await ws.send_str(json.dumps({"event_type": "book", "n": 1}))
+        await ws.send_bytes(json.dumps([{"event_type": "book", "n": 2}]).encode())
+        await ws.send_str("not json")
+        await ws.ping()
+        await ws.send_str(json.dumps({"event_type": "book", "n": 3}))
+        await ws.close()
+        return ws
+
+    async def run():
+        server = await _serve(handler)
+        try:
+            session = await wsh.get_session()
+            ws = await session.ws_connect(server.make_url("/"))
+            queue = asyncio.Queue()
+            await wsh._pump(ws, queue, "Market", wsh.RestartPolicy())
+            return [queue.get_nowait() for _ in range(queue.qsize())]
+        finally:
+            await wsh.close_session()
+            await server.close()
+
+    payloads = asyncio.run(run())
+    # TEXT and BINARY frames are parsed, undecodable ones skipped, control frames ignored,
+    # and the close frame ends the loop
+    assert payloads == [
+        {"event_type": "book", "n": 1},
+        [{"event_type": "book", "n": 2}],
+        {"event_type": "book", "n": 3},
+    ]
@@ -1,6 +1,6 @@
 import time
 import pandas as pd
-from data_updater.trading_utils import get_clob_client
+from data_updater.trading_utils import get_clob_client, reset_clob_client
 from data_updater.google_utils import get_spreadsheet
 from data_updater.find_markets import get_sel_df, get_all_markets, get_all_results, get_markets, add_volatility_to_df
 from gspread_dataframe import set_with_dataframe
@@ -78,6 +78,7 @@ def fetch_and_process_data():
     global spreadsheet, client, wk_all, wk_vol, sel_df
     
     spreadsheet = get_spreadsheet()
+    # Reuses the cached client; a failed cycle resets it so the next one builds a fresh client
     client = get_clob_client()
 
     wk_all = spreadsheet.worksheet("All Markets")
@@ -131,3 +132,4 @@ if __name__ == "__main__":
         except Exception as e:
             traceback.print_exc()
             print(str(e))
+            reset_clob_client()